@@ -0,0 +1,91 @@
+"""URL-схема режима ASGI.
+
+Горячие GET-эндпоинты обслуживаются асинхронными представлениями,
+остальные методы и адреса — теми же представлениями DRF, что и в WSGI.
+"""
+
+from django.urls import path
+
+from foodgram import urls
+from recipes.async_views import (
+    IngredientDetailView,
+    IngredientListView,
+    RecipeDetailView,
+    RecipeListView,
+    TagDetailView,
+    TagListView,
+)
+from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from users.async_views import SubscriptionListView
+from users.views import UserViewSet
+
+LIST = {"get": "list", "post": "create"}
+DETAIL = {
+    "get": "retrieve",
+    "put": "update",
+    "patch": "partial_update",
+    "delete": "destroy",
+}
+
+
+def fallback(viewset, basename, actions, detail, **initkwargs):
+    """Представление DRF с теми же параметрами, что создаёт роутер."""
+    return viewset.as_view(
+        actions, basename=basename, detail=detail, **initkwargs
+    )
+
+
+urlpatterns = [
+    path(
+        "api/recipes/",
+        RecipeListView.as_view(
+            fallback=fallback(RecipeViewSet, "recipes", LIST, False)
+        ),
+    ),
+    path(
+        "api/recipes/<int:pk>/",
+        RecipeDetailView.as_view(
+            fallback=fallback(RecipeViewSet, "recipes", DETAIL, True)
+        ),
+    ),
+    path(
+        "api/ingredients/",
+        IngredientListView.as_view(
+            fallback=fallback(
+                IngredientViewSet, "ingredients", {"get": "list"}, False
+            )
+        ),
+    ),
+    path(
+        "api/ingredients/<int:pk>/",
+        IngredientDetailView.as_view(
+            fallback=fallback(
+                IngredientViewSet, "ingredients", {"get": "retrieve"}, True
+            )
+        ),
+    ),
+    path(
+        "api/tags/",
+        TagListView.as_view(
+            fallback=fallback(TagViewSet, "tags", {"get": "list"}, False)
+        ),
+    ),
+    path(
+        "api/tags/<int:pk>/",
+        TagDetailView.as_view(
+            fallback=fallback(TagViewSet, "tags", {"get": "retrieve"}, True)
+        ),
+    ),
+    path(
+        "api/users/subscriptions/",
+        SubscriptionListView.as_view(
+            fallback=fallback(
+                UserViewSet,
+                "users",
+                {"get": "subscriptions"},
+                False,
+                **UserViewSet.subscriptions.kwargs,
+            )
+        ),
+    ),
+] + urls.urlpatterns
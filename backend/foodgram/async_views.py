@@ -0,0 +1,113 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views import View
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from foodgram.conditional import make_etag
+from users.authentication import token_cache
+
+
+async def aauthenticate(request):
+    """Асинхронный аналог CachedTokenAuthentication.
+
+    Возвращает None, если заголовок некорректен: такой запрос
+    обрабатывает DRF, чтобы ответ об ошибке совпадал.
+    """
+    header = request.headers.get("Authorization", "").split()
+    if not header or header[0].lower() != "token":
+        return AnonymousUser()
+    if len(header) != 2:
+        return None
+    user = await token_cache.aget(header[1])
+    if user is not None:
+        return user
+    try:
+        token = await Token.objects.select_related("user").aget(key=header[1])
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    token_cache.set(header[1], token.user)
+    return token.user
+
+
+class AsyncReadView(View):
+    """Асинхронное GET-представление для режима ASGI.
+
+    Подкласс обязан определить корутину ``aget(request, *args,
+    **kwargs)``, где ``request`` — Request DRF с уже определённым
+    пользователем; базовой реализации нет. Прочие методы, браузерный
+    API и запросы с ошибкой аутентификации передаются синхронному
+    представлению DRF ``fallback``.
+    """
+
+    fallback = None
+    vary_headers = ("Accept",)
+    renderer = JSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # CSRF проверяет DRF в синхронном представлении.
+        view.csrf_exempt = True
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        if "text/html" in request.headers.get("Accept", "") or (
+            "format" in request.GET
+        ):
+            return await self.delegate(request, *args, **kwargs)
+        user = await aauthenticate(request)
+        if user is None:
+            return await self.delegate(request, *args, **kwargs)
+        drf_request = Request(request)
+        drf_request.user = user
+        try:
+            response = await self.aget(drf_request, *args, **kwargs)
+        except Http404:
+            response = self.error_response(NotFound())
+        except APIException as exc:
+            response = self.error_response(exc)
+        patch_vary_headers(response, self.vary_headers)
+        return response
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.fallback)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = delegate
+
+    def not_modified(self, request, parts):
+        """Ответ 304 или None; ETag запоминается для render."""
+        self.etag = make_etag(parts) if parts is not None else None
+        if self.etag is None:
+            return None
+        response = get_conditional_response(request, etag=self.etag)
+        if response is not None:
+            response["ETag"] = self.etag
+        return response
+
+    def render(self, data, status=200):
+        response = HttpResponse(
+            self.renderer.render(data),
+            status=status,
+            content_type=self.renderer.media_type,
+        )
+        if getattr(self, "etag", None):
+            response["ETag"] = self.etag
+        return response
+
+    def error_response(self, exc):
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        self.etag = None
+        response = self.render(data, status=exc.status_code)
+        if getattr(exc, "auth_header", None):
+            response["WWW-Authenticate"] = exc.auth_header
+        return response
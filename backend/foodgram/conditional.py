@@ -0,0 +1,49 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(parts):
+    key = ":".join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """ETag для list и retrieve.
+
+    Подкласс обязан определить ``get_etag_parts(request, *args,
+    **kwargs)``: метод возвращает дешёвые версии ресурса из общего
+    кэша или ``None``, если ETag не нужен. При совпадении If-None-Match
+    ответ 304 отдаётся без обращения к сериализаторам.
+    """
+
+    vary_headers = ()
+
+    def get_etag(self, request, *args, **kwargs):
+        parts = self.get_etag_parts(request, *args, **kwargs)
+        if parts is None:
+            return None
+        return make_etag(parts)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request, *args, **kwargs)
+        response = None
+        if etag:
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if etag and response.status_code in (200, 304):
+            response["ETag"] = etag
+        patch_vary_headers(response, self.vary_headers)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
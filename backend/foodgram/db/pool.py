@@ -0,0 +1,200 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_INTERVAL = 60
+
+ACQUIRES_KEY = "db:acquires"
+CONNECTS_KEY = "db:connects"
+WAITS_KEY = "db:waits"
+TIMEOUTS_KEY = "db:timeouts"
+DISCARDS_KEY = "db:discards"
+ACQUIRE_TIME_KEY = "db:acquire_us"
+CONNECT_TIME_KEY = "db:connect_us"
+STATS_KEYS = {
+    "acquires": ACQUIRES_KEY,
+    "connects": CONNECTS_KEY,
+    "waits": WAITS_KEY,
+    "timeouts": TIMEOUTS_KEY,
+    "discards": DISCARDS_KEY,
+    "acquire_us": ACQUIRE_TIME_KEY,
+    "connect_us": CONNECT_TIME_KEY,
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionStats:
+    """Метрики соединений процесса.
+
+    Копятся в памяти и раз в ``STATS_FLUSH_EVERY`` получений соединения
+    или ``STATS_FLUSH_INTERVAL`` секунд переносятся в общий кэш, как
+    статистика коротких ссылок.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = dict.fromkeys(STATS_KEYS, 0)
+        self.flushed_at = time.monotonic()
+
+    def record(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.pending[name] += delta
+            if (
+                self.pending["acquires"] < STATS_FLUSH_EVERY
+                and time.monotonic() - self.flushed_at < STATS_FLUSH_INTERVAL
+            ):
+                return
+            pending = self.take()
+        self.flush(pending)
+
+    def take(self):
+        pending, self.pending = self.pending, dict.fromkeys(STATS_KEYS, 0)
+        self.flushed_at = time.monotonic()
+        return pending
+
+    def flush(self, pending=None):
+        if pending is None:
+            with self.lock:
+                pending = self.take()
+        for name, delta in pending.items():
+            if not delta:
+                continue
+            key = STATS_KEYS[name]
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                cache.set(key, delta, None)
+
+
+stats = ConnectionStats()
+
+
+def get_stats():
+    counters = cache.get_many(STATS_KEYS.values())
+    return {name: counters.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+class ConnectionPool:
+    """Пул соединений процесса для потоковых и асинхронных воркеров.
+
+    Не больше ``max_size`` соединений; если все заняты, ``acquire``
+    ждёт освобождения не дольше ``timeout`` секунд. Закрытые,
+    не прошедшие проверку и старше ``max_age`` секунд соединения
+    заменяются новыми.
+    """
+
+    def __init__(self, max_size, timeout, max_age=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.idle = []
+        self.created = {}
+        self.size = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, connect, check=None):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = timed_out = False
+        connection = None
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    timed_out = True
+                    break
+            else:
+                if self.idle:
+                    connection = self.idle.pop()
+                else:
+                    self.size += 1
+        if timed_out:
+            stats.record(waits=1, timeouts=1)
+            raise PoolTimeout(f"Все {self.max_size} соединений пула заняты.")
+        if connection is not None and not self.is_usable(connection, check):
+            self.close(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = self.open(connect)
+            except Exception:
+                with self.condition:
+                    self.size -= 1
+                    self.condition.notify()
+                raise
+        stats.record(
+            acquires=1,
+            waits=int(waited),
+            acquire_us=int((time.perf_counter() - start) * 1_000_000),
+        )
+        return connection
+
+    def release(self, connection, reset=None):
+        usable = not connection.closed and not self.is_expired(connection)
+        if usable and reset is not None:
+            try:
+                reset(connection)
+            except Exception:
+                usable = False
+        if not usable:
+            self.close(connection)
+        with self.condition:
+            if usable:
+                self.idle.append(connection)
+            else:
+                self.size -= 1
+            self.condition.notify()
+
+    def open(self, connect):
+        start = time.perf_counter()
+        connection = connect()
+        self.created[id(connection)] = time.monotonic()
+        stats.record(
+            connects=1,
+            connect_us=int((time.perf_counter() - start) * 1_000_000),
+        )
+        return connection
+
+    def close(self, connection):
+        self.created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        stats.record(discards=1)
+
+    def is_expired(self, connection):
+        if self.max_age is None:
+            return False
+        created = self.created.get(id(connection), 0)
+        return time.monotonic() - created > self.max_age
+
+    def is_usable(self, connection, check=None):
+        if connection.closed or self.is_expired(connection):
+            return False
+        if check is None:
+            return True
+        try:
+            check(connection)
+        except Exception:
+            return False
+        return True
+
+    def close_all(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+        for connection in idle:
+            self.close(connection)
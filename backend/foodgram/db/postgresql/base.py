@@ -0,0 +1,100 @@
+import threading
+import time
+from functools import partial
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.postgresql import base
+
+from foodgram.db.pool import ConnectionPool, PoolTimeout, stats
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с метриками соединений и опциональным пулом процесса.
+
+    Пул включается ключом ``POOL`` настроек БД с ``MAX_SIZE`` больше
+    нуля. Тогда ``close()`` возвращает соединение в пул, а
+    ``CONN_HEALTH_CHECKS`` проверяет его перед выдачей. Без пула
+    получением считается первое обращение к соединению в запросе,
+    поэтому видно, сколько запросов обошлись постоянным соединением
+    (``CONN_MAX_AGE``).
+    """
+
+    acquired = False
+
+    def ensure_connection(self):
+        if self.acquired or self.get_pool() is not None:
+            return super().ensure_connection()
+        start = time.perf_counter()
+        super().ensure_connection()
+        self.acquired = True
+        stats.record(
+            acquires=1,
+            acquire_us=int((time.perf_counter() - start) * 1_000_000),
+        )
+
+    def get_pool(self):
+        options = self.settings_dict.get("POOL") or {}
+        if not options.get("MAX_SIZE"):
+            return None
+        with pools_lock:
+            if self.alias not in pools:
+                pools[self.alias] = ConnectionPool(
+                    options["MAX_SIZE"],
+                    options.get("TIMEOUT", 10),
+                    options.get("MAX_AGE"),
+                )
+            return pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            start = time.perf_counter()
+            connection = super().get_new_connection(conn_params)
+            stats.record(
+                connects=1,
+                connect_us=int((time.perf_counter() - start) * 1_000_000),
+            )
+            return connection
+        check = None
+        if self.settings_dict["CONN_HEALTH_CHECKS"]:
+            check = self.check_pooled
+        try:
+            connection = pool.acquire(
+                partial(super().get_new_connection, conn_params), check
+            )
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+        # Соединению из пула уровень изоляции не задан родителем.
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict["OPTIONS"].get(
+                "isolation_level", base.IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        pool.release(self.connection, self.reset_pooled)
+
+    @staticmethod
+    def check_pooled(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    @staticmethod
+    def reset_pooled(connection):
+        connection.rollback()
+
+
+def reset_acquired(**kwargs):
+    for connection in connections.all(initialized_only=True):
+        connection.acquired = False
+
+
+request_started.connect(reset_acquired)
@@ -0,0 +1,139 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMAT = "WEBP"
+VARIANT_EXTENSION = "webp"
+VARIANT_QUALITY = 80
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix="image-variants",
+        )
+    return _executor
+
+
+def needs_variants(instance, image_field, variants_field):
+    image = getattr(instance, image_field)
+    variants = getattr(instance, variants_field) or {}
+    return bool(image) and variants.get("source") != image.name
+
+
+def schedule_variants(instance, image_field, variants_field, sizes, callback):
+    """Ставит построение вариантов в очередь после коммита транзакции.
+
+    ``callback(pk)`` вызывается после сохранения вариантов, например
+    для инвалидации кэша представлений.
+    """
+    args = (
+        type(instance),
+        instance.pk,
+        getattr(instance, image_field).name,
+        image_field,
+        variants_field,
+        sizes,
+        callback,
+    )
+
+    def submit():
+        if settings.IMAGE_VARIANT_WORKERS:
+            get_executor().submit(run_in_worker, *args)
+        else:
+            build_variants(*args)
+
+    transaction.on_commit(submit)
+
+
+def run_in_worker(*args):
+    close_old_connections()
+    try:
+        build_variants(*args)
+    except Exception:
+        logger.exception("Не удалось построить варианты изображения")
+    finally:
+        close_old_connections()
+
+
+def build_variants(
+    model, pk, source, image_field, variants_field, sizes, callback
+):
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or getattr(instance, image_field).name != source:
+        return
+    field_file = getattr(instance, image_field)
+    storage = field_file.storage
+    try:
+        with storage.open(source, "rb") as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Не удалось открыть изображение %s", source)
+        return
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    directory, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    variants = {"source": source}
+    for label, size in sizes.items():
+        variant = image.copy()
+        variant.thumbnail(size)
+        buffer = BytesIO()
+        variant.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+        variants[label] = storage.save(
+            os.path.join(
+                directory, "variants", f"{stem}_{label}.{VARIANT_EXTENSION}"
+            ),
+            ContentFile(buffer.getvalue()),
+        )
+    previous = getattr(instance, variants_field) or {}
+    updated = model.objects.filter(pk=pk, **{image_field: source}).update(
+        **{variants_field: variants}
+    )
+    stale = previous if updated else variants
+    for label, name in stale.items():
+        if label != "source" and name:
+            storage.delete(name)
+    if updated:
+        callback(pk)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URL вариантов изображения; до их готовности — URL оригинала."""
+
+    def __init__(self, image_field, variants_field, labels, **kwargs):
+        self.image_field = image_field
+        self.variants_field = variants_field
+        self.labels = labels
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image:
+            return None
+        variants = getattr(instance, self.variants_field) or {}
+        ready = variants.get("source") == image.name
+        request = self.context.get("request")
+        result = {}
+        for label in self.labels:
+            name = variants.get(label) if ready else None
+            url = image.storage.url(name) if name else image.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            result[label] = url
+        return result
@@ -0,0 +1,169 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+QUEUE_SIZE = 10000
+REQUEST_ID_HEADER = "X-Request-ID"
+RECORD_FIELDS = ("request_id", "view", "method", "path", "status")
+
+request_id = ContextVar("request_id", default=None)
+request_logger = logging.getLogger("foodgram.request")
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной строкой JSON."""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        duration = getattr(record, "duration", None)
+        if duration is not None:
+            data["duration_ms"] = round(duration * 1000, 2)
+        sql = getattr(record, "sql", None)
+        if sql is not None:
+            data["sql"] = sql
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestQueueHandler(QueueHandler):
+    """Кладёт записи в очередь, не дожидаясь записи на диск.
+
+    Текст сообщения и id запроса фиксируются в потоке запроса;
+    форматирование и запись выполняет QueueListener в своём потоке.
+    При переполненной очереди запись отбрасывается.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id.get()
+        # Трассировка держит кадры стека, поэтому форматируется сразу.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def queue_handler(filename=None):
+    """Обработчик для LOGGING: очередь перед stdout или файлом.
+
+    Каждый воркер gunicorn пишет через свой обработчик, поэтому файл
+    не ротируется изнутри процесса: WatchedFileHandler переоткрывает
+    его после внешней ротации (logrotate), а stdout ротирует Docker.
+    """
+    if filename:
+        target = WatchedFileHandler(filename, encoding="utf-8", delay=True)
+    else:
+        target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter())
+    records = queue.Queue(QUEUE_SIZE)
+    listener = QueueListener(records, target)
+    listener.start()
+    atexit.register(listener.stop)
+    return RequestQueueHandler(records)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю ``rate`` записей и все запросы дольше ``slow_ms``.
+
+    Django пишет SQL в django.db.backends только при DEBUG.
+    """
+
+    def __init__(self, rate=0.0, slow_ms=None):
+        super().__init__()
+        self.rate = rate
+        self.slow_ms = slow_ms
+
+    def filter(self, record):
+        duration = getattr(record, "duration", None)
+        if (
+            self.slow_ms is not None
+            and duration is not None
+            and duration * 1000 >= self.slow_ms
+        ):
+            return True
+        return random.random() < self.rate
+
+
+def start_request(request):
+    value = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    return request_id.set(value[:64]), time.perf_counter()
+
+
+def finish_request(request, response, token, start):
+    match = request.resolver_match
+    request_logger.info(
+        "%s %s %s",
+        request.method,
+        request.path,
+        response.status_code,
+        extra={
+            "view": match.view_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration": time.perf_counter() - start,
+        },
+    )
+    response[REQUEST_ID_HEADER] = request_id.get()
+    request_id.reset(token)
+    return response
+
+
+@sync_and_async_middleware
+def request_log_middleware(get_response):
+    """Присваивает запросу id и пишет строку лога с длительностью."""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token, start = start_request(request)
+            response = await get_response(request)
+            return finish_request(request, response, token, start)
+
+    else:
+
+        def middleware(request):
+            token, start = start_request(request)
+            response = get_response(request)
+            return finish_request(request, response, token, start)
+
+    return middleware
@@ -0,0 +1,24 @@
+class ManagedFieldsMixin:
+    """Не даёт ``save()`` перезаписать поля, которые меняет update().
+
+    Счётчики, коды ссылок и варианты изображений обновляются запросами
+    ``update()`` и ``F()``. Экземпляр, загруженный раньше, при обычном
+    ``save()`` вернул бы их старые значения, поэтому при обновлении
+    строки без явного ``update_fields`` они не записываются.
+    """
+
+    managed_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.managed_fields
+            ]
+        super().save(*args, **kwargs)
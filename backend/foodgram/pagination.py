@@ -1,6 +1,144 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений."""
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        self.page.object_list = [
+            item async for item in self.page.object_list
+        ]
+        self.request = request
+        return list(self.page)
+
+
+class RecipePagination(CustomPagination):
+    """Постраничная выдача рецептов с опциональным режимом курсора.
+
+    Без параметра ``cursor`` работает как CustomPagination. С параметром
+    ``cursor`` (для первой страницы пустым) страницы выбираются по ключу
+    (pub_date, id) без OFFSET и COUNT(*), а в ответе возвращаются
+    непрозрачные курсоры ``next`` и ``previous``.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        queryset = self.get_cursor_queryset(queryset, request)
+        return self.get_cursor_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return await super().apaginate_queryset(queryset, request, view)
+        queryset = self.get_cursor_queryset(queryset, request)
+        return self.get_cursor_page([item async for item in queryset])
+
+    def get_cursor_queryset(self, queryset, request):
+        self.request = request
+        self.cursor_page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if self.reverse:
+            queryset = queryset.order_by("pub_date", "id")
+        else:
+            queryset = queryset.order_by("-pub_date", "-id")
+        if self.position is not None:
+            pub_date, recipe_id = self.position
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date)
+                    | Q(pub_date=pub_date, id__gt=recipe_id)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, id__lt=recipe_id)
+                )
+        return queryset[: self.cursor_page_size + 1]
+
+    def get_cursor_page(self, results):
+        has_more = len(results) > self.cursor_page_size
+        results = results[: self.cursor_page_size]
+        if self.reverse:
+            results.reverse()
+            has_next, has_previous = self.position is not None, has_more
+        else:
+            has_next, has_previous = has_more, self.position is not None
+        self.next_position = (
+            self.get_position(results[-1]) if has_next and results else None
+        )
+        self.previous_position = (
+            self.get_position(results[0])
+            if has_previous and results
+            else None
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_cursor_link(self.next_position, False),
+                "previous": self.get_cursor_link(
+                    self.previous_position, True
+                ),
+                "results": data,
+            }
+        )
+
+    def get_position(self, recipe):
+        return recipe.pub_date, recipe.id
+
+    def get_cursor_link(self, position, reverse):
+        if position is None:
+            return None
+        pub_date, recipe_id = position
+        payload = json.dumps(
+            {"d": pub_date.isoformat(), "i": recipe_id, "r": int(reverse)}
+        )
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            cursor,
+        )
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            pub_date = datetime.fromisoformat(payload["d"])
+            return (pub_date, int(payload["i"])), bool(payload["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
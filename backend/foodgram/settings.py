@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 CORS_ORIGIN_ALLOW_ALL = True
 
 MIDDLEWARE = [
+    "foodgram.log.request_log_middleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -38,7 +40,13 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "foodgram.urls"
+# wsgi — синхронные воркеры gunicorn, asgi — воркеры uvicorn
+# с асинхронными представлениями для горячих GET-запросов.
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
+
+ROOT_URLCONF = (
+    "foodgram.asgi_urls" if SERVER_MODE == "asgi" else "foodgram.urls"
+)
 
 TEMPLATES = [
     {
@@ -58,6 +66,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "foodgram.wsgi.application"
 
+# В WSGI постоянные соединения живут DB_CONN_MAX_AGE секунд. В ASGI
+# каждый запрос идёт в новом потоке и постоянные соединения не
+# переиспользуются; пул процесса включается явно: DB_ENGINE
+# foodgram.db.postgresql и DB_POOL_MAX_SIZE > 0.
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "60"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "0"))
+
 DATABASES = {
     "default": {
         "ENGINE": os.environ.get("DB_ENGINE", "django.db.backends.postgresql"),
@@ -66,6 +81,19 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "postgres"),
         "HOST": os.environ.get("DB_HOST", "db"),
         "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": (
+            0
+            if DB_POOL_MAX_SIZE or SERVER_MODE == "asgi"
+            else DB_CONN_MAX_AGE
+        ),
+        "CONN_HEALTH_CHECKS": (
+            os.environ.get("DB_CONN_HEALTH_CHECKS", "1") == "1"
+        ),
+        "POOL": {
+            "MAX_SIZE": DB_POOL_MAX_SIZE,
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            "MAX_AGE": DB_CONN_MAX_AGE or None,
+        },
     }
 }
 
@@ -79,6 +107,19 @@ DATABASES = {
 }
 """
 
+# В кэше лежат версии рецептов, справочников и ETag, поэтому при
+# нескольких процессах он должен быть общим (Redis в docker-compose).
+# LocMemCache годится только для одного процесса: gunicorn с ним и
+# несколькими воркерами не запустится (см. gunicorn.conf.py).
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -108,9 +149,54 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Медиафайлы именуются по хэшу содержимого и не дублируются.
+STORAGES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "MEDIA_STORAGE_BACKEND",
+            "foodgram.storage.ContentAddressedFileSystemStorage",
+        ),
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Варианты изображений строятся в фоне; 0 — синхронно после коммита.
+IMAGE_VARIANT_WORKERS = int(os.environ.get("IMAGE_VARIANT_WORKERS", "2"))
+RECIPE_IMAGE_VARIANTS = {"card": (480, 480), "detail": (1200, 1200)}
+AVATAR_VARIANTS = {"small": (64, 64), "medium": (160, 160)}
+
+# Ограничения для multipart-загрузки изображений.
+MAX_IMAGE_UPLOAD_SIZE = int(
+    os.environ.get("MAX_IMAGE_UPLOAD_SIZE", str(20 * 1024 * 1024))
+)
+MAX_IMAGE_DIMENSION = int(os.environ.get("MAX_IMAGE_DIMENSION", "8000"))
+
+# Срок в секундах, после которого снимок тегов и ингредиентов процесса
+# перечитывается из БД, даже если версия справочников не менялась.
+REFERENCE_SNAPSHOT_TTL = int(os.environ.get("REFERENCE_SNAPSHOT_TTL", "60"))
+
+# TrueType шрифт с кириллицей для списка покупок в PDF
+# (пакет fonts-dejavu-core в образе).
+SHOPPING_LIST_PDF_FONT = os.environ.get(
+    "SHOPPING_LIST_PDF_FONT",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+
+# Размер LRU кодов коротких ссылок в каждом процессе.
+SHORT_LINK_CACHE_SIZE = int(os.environ.get("SHORT_LINK_CACHE_SIZE", "10000"))
+
+# Кэш токенов: размер LRU процесса, срок жизни записи в секундах и
+# хранение записей в общем кэше CACHES вместо LRU. Поколения
+# пользователей для сброса записей всегда лежат в CACHES.
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_SHARED = os.environ.get("TOKEN_CACHE_SHARED", "0") == "1"
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -144,22 +230,54 @@ DJOSER = {
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Логи пишутся строками JSON в отдельном потоке через очередь: в stdout
+# или, если задан LOG_FILE, в файл с внешней ротацией.
+# SQL (только при DEBUG) пишется выборочно: доля LOG_SQL_SAMPLE_RATE
+# и все запросы дольше LOG_SQL_SLOW_MS.
+# В manage.py test логи по умолчанию выключены, их включает LOG_LEVEL.
+TESTING = sys.argv[1:2] == ["test"]
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "CRITICAL" if TESTING else "INFO")
+LOG_FILE = os.environ.get("LOG_FILE", "")
+LOG_SQL_SAMPLE_RATE = float(os.environ.get("LOG_SQL_SAMPLE_RATE", "0"))
+LOG_SQL_SLOW_MS = int(os.environ.get("LOG_SQL_SLOW_MS", "200"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "sql_sampling": {
+            "()": "foodgram.log.SamplingFilter",
+            "rate": LOG_SQL_SAMPLE_RATE,
+            "slow_ms": LOG_SQL_SLOW_MS,
+        },
+    },
     "handlers": {
-        "file": {
-            "level": "DEBUG",
-            "class": "logging.FileHandler",
-            "filename": os.path.join(BASE_DIR, "debug.log"),
+        "queue": {
+            "()": "foodgram.log.queue_handler",
+            "filename": LOG_FILE,
         },
     },
     "loggers": {
         "django": {
-            "handlers": ["file"],
-            "level": "DEBUG",
+            "handlers": ["queue"],
+            "level": LOG_LEVEL,
             "propagate": True,
         },
+        "django.db.backends": {
+            "handlers": ["queue"],
+            "level": "DEBUG",
+            "filters": ["sql_sampling"],
+            "propagate": False,
+        },
+        # Фильтр логгера не действует на записи дочерних логгеров.
+        "django.db.backends.schema": {
+            "level": LOG_LEVEL,
+        },
+        "foodgram": {
+            "handlers": ["queue"],
+            "level": LOG_LEVEL,
+            "propagate": False,
+        },
     },
 }
 
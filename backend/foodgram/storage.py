@@ -0,0 +1,53 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedMixin:
+    """Хранилище, именующее файлы по SHA-256 содержимого.
+
+    Одинаковые файлы сохраняются один раз, а URL файла никогда не
+    меняет содержимое, поэтому его можно кэшировать бессрочно.
+    Подмешивается к любому хранилищу Django.
+
+    Один файл может использоваться несколькими объектами, поэтому
+    ``delete`` ничего не удаляет; неиспользуемые файлы удаляет команда
+    ``prune_media`` через ``purge``.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        digest = digest.hexdigest()
+        return os.path.join(directory, digest[:2], f"{digest}{extension}")
+
+    def delete(self, name):
+        pass
+
+    def purge(self, name):
+        super().delete(name)
+
+
+class ContentAddressedFileSystemStorage(
+    ContentAddressedMixin, FileSystemStorage
+):
+    pass
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+ALLOWED_IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+
+def spool_uploads_to_disk(request):
+    """Сохраняет файлы multipart-запроса сразу во временные файлы.
+
+    Вызывать до первого обращения к ``request.data``.
+    """
+    django_request = request._request
+    django_request.upload_handlers = [
+        TemporaryFileUploadHandler(django_request)
+    ]
+
+
+class UploadedImageField(serializers.FileField):
+    """Изображение из multipart-запроса.
+
+    Формат и размеры проверяются по заголовку файла, без декодирования
+    пикселей.
+    """
+
+    default_error_messages = {
+        "invalid_image": "Загрузите корректное изображение.",
+        "invalid_format": "Допустимые форматы: {formats}.",
+        "too_large": "Размер файла не должен превышать {max_size} байт.",
+        "too_big": "Размеры изображения не должны превышать {max_side} px.",
+    }
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        if file.size > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.fail("too_large", max_size=settings.MAX_IMAGE_UPLOAD_SIZE)
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            self.fail("invalid_image")
+        if image_format not in ALLOWED_IMAGE_FORMATS:
+            self.fail(
+                "invalid_format", formats=", ".join(ALLOWED_IMAGE_FORMATS)
+            )
+        if max(width, height) > settings.MAX_IMAGE_DIMENSION:
+            self.fail("too_big", max_side=settings.MAX_IMAGE_DIMENSION)
+        file.seek(0)
+        return file
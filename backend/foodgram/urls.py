@@ -1,7 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from recipes.views import RecipeViewSet, IngredientViewSet, TagViewSet
+from recipes.views import (
+    RecipeViewSet,
+    IngredientViewSet,
+    TagViewSet,
+    short_link_redirect,
+)
 from users.views import UserViewSet
 
 from django.conf import settings
@@ -19,6 +24,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include(router.urls)),
     path("api/auth/", include("djoser.urls.authtoken")),
+    path("s/<str:code>/", short_link_redirect, name="short-link"),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
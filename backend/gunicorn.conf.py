@@ -0,0 +1,26 @@
+import os
+
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+
+if SERVER_MODE == "asgi":
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "foodgram.asgi:application"
+else:
+    wsgi_app = "foodgram.wsgi:application"
+
+
+def on_starting(server):
+    # Версии кэша рецептов, справочников и ETag хранятся в
+    # CACHES["default"]; в памяти процесса воркеры их не увидят.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+    from django.conf import settings
+
+    backend = settings.CACHES["default"]["BACKEND"]
+    if server.cfg.workers > 1 and backend.endswith(".LocMemCache"):
+        raise RuntimeError(
+            "LocMemCache не общий для воркеров: задайте CACHE_BACKEND "
+            "(например, RedisCache) или GUNICORN_WORKERS=1."
+        )
@@ -9,6 +9,13 @@ admin.site.register(Amount)
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("name", "author", "cooking_time")
+    list_display = (
+        "name",
+        "author",
+        "cooking_time",
+        "favorites_count",
+        "in_carts_count",
+    )
+    readonly_fields = ("favorites_count", "in_carts_count")
     search_fields = ("name", "author", "tags")
     list_filter = ("name", "author", "tags")
@@ -0,0 +1,134 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+
+from foodgram.async_views import AsyncReadView
+from foodgram.pagination import RecipePagination
+from recipes.filters import RecipeFilter
+from recipes.models import Recipe
+from recipes.reference import aget_reference_snapshot
+from recipes.serializers import (
+    IngredientSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from recipes.views import (
+    get_from_snapshot,
+    get_recipe_etag_parts,
+    get_recipe_list_etag_parts,
+    get_recipe_queryset,
+    get_reference_etag_parts,
+    parse_recipe_id,
+    search_ingredients,
+)
+from users.subscriptions import get_subscription_cache
+
+
+class RecipeListView(AsyncReadView):
+    vary_headers = ("Accept", "Authorization")
+
+    async def aget(self, request):
+        response = self.not_modified(
+            request, get_recipe_list_etag_parts(request)
+        )
+        if response is not None:
+            return response
+        filterset = RecipeFilter(
+            request.query_params,
+            queryset=get_recipe_queryset(request.user),
+            request=request,
+        )
+        # Проверка тегов в форме фильтра обращается к БД синхронно.
+        if not await sync_to_async(filterset.is_valid)():
+            raise ValidationError(filterset.errors)
+        paginator = RecipePagination()
+        recipes = await paginator.apaginate_queryset(filterset.qs, request)
+        await get_subscription_cache(request).aprime(
+            recipe.author_id for recipe in recipes
+        )
+        serializer = RecipeSerializer(
+            recipes, many=True, context={"request": request}
+        )
+        return self.render(
+            paginator.get_paginated_response(serializer.data).data
+        )
+
+
+class RecipeDetailView(AsyncReadView):
+    vary_headers = ("Accept", "Authorization")
+
+    async def aget(self, request, pk):
+        recipe_id = parse_recipe_id(pk)
+        if recipe_id is None:
+            raise Http404
+        author_id = (
+            await Recipe.objects.filter(pk=recipe_id)
+            .values_list("author_id", flat=True)
+            .afirst()
+        )
+        if author_id is None:
+            raise Http404
+        response = self.not_modified(
+            request, get_recipe_etag_parts(request, recipe_id, author_id)
+        )
+        if response is not None:
+            return response
+        try:
+            recipe = await get_recipe_queryset(request.user).aget(
+                pk=recipe_id
+            )
+        except Recipe.DoesNotExist:
+            raise Http404
+        await get_subscription_cache(request).aprime([recipe.author_id])
+        serializer = RecipeSerializer(recipe, context={"request": request})
+        return self.render(serializer.data)
+
+
+class IngredientListView(AsyncReadView):
+    async def aget(self, request):
+        response = self.not_modified(
+            request,
+            get_reference_etag_parts("ingredients", "list", "", request),
+        )
+        if response is not None:
+            return response
+        ingredients = search_ingredients(
+            await aget_reference_snapshot(), request
+        )
+        return self.render(IngredientSerializer(ingredients, many=True).data)
+
+
+class IngredientDetailView(AsyncReadView):
+    async def aget(self, request, pk):
+        response = self.not_modified(
+            request,
+            get_reference_etag_parts("ingredients", "retrieve", pk, request),
+        )
+        if response is not None:
+            return response
+        snapshot = await aget_reference_snapshot()
+        ingredient = get_from_snapshot(snapshot.ingredients_by_id, pk)
+        return self.render(IngredientSerializer(ingredient).data)
+
+
+class TagListView(AsyncReadView):
+    async def aget(self, request):
+        response = self.not_modified(
+            request, get_reference_etag_parts("tags", "list", "", request)
+        )
+        if response is not None:
+            return response
+        snapshot = await aget_reference_snapshot()
+        return self.render(TagSerializer(snapshot.tags, many=True).data)
+
+
+class TagDetailView(AsyncReadView):
+    async def aget(self, request, pk):
+        response = self.not_modified(
+            request, get_reference_etag_parts("tags", "retrieve", pk, request)
+        )
+        if response is not None:
+            return response
+        snapshot = await aget_reference_snapshot()
+        tag = get_from_snapshot(snapshot.tags_by_id, pk)
+        return self.render(TagSerializer(tag).data)
@@ -0,0 +1,169 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+# Увеличить при изменении формата RecipeSerializer.
+REPRESENTATION_VERSION = 3
+
+REFERENCE_VERSION_KEY = "recipes:reference:version"
+RECIPES_VERSION_KEY = "recipes:all:version"
+HITS_KEY = "recipes:representation:hits"
+MISSES_KEY = "recipes:representation:misses"
+
+
+def recipe_version_key(recipe_id):
+    return f"recipes:recipe:{recipe_id}:version"
+
+
+def author_version_key(author_id):
+    return f"recipes:author:{author_id}:version"
+
+
+def recipe_counters_key(recipe_id):
+    return f"recipes:recipe:{recipe_id}:counters"
+
+
+def author_counters_key(author_id):
+    return f"recipes:author:{author_id}:counters"
+
+
+def user_version_key(user_id):
+    return f"recipes:user:{user_id}:version"
+
+
+def new_version():
+    return time.time_ns()
+
+
+def bump_recipe(recipe_id):
+    version = new_version()
+    cache.set_many(
+        {recipe_version_key(recipe_id): version, RECIPES_VERSION_KEY: version},
+        None,
+    )
+
+
+def bump_recipes(recipe_ids):
+    """Версии для рецептов, изменённых массовыми операциями без сигналов."""
+    version = new_version()
+    versions = {
+        recipe_version_key(recipe_id): version for recipe_id in recipe_ids
+    }
+    versions[RECIPES_VERSION_KEY] = version
+    cache.set_many(versions, None)
+
+
+def bump_author(author_id):
+    version = new_version()
+    cache.set_many(
+        {author_version_key(author_id): version, RECIPES_VERSION_KEY: version},
+        None,
+    )
+
+
+def bump_counters(recipe_ids=(), author_ids=()):
+    """Версии счётчиков для ETag; кэш представлений не сбрасывается."""
+    version = new_version()
+    versions = {
+        recipe_counters_key(recipe_id): version for recipe_id in recipe_ids
+    }
+    versions.update(
+        (author_counters_key(author_id), version) for author_id in author_ids
+    )
+    versions[RECIPES_VERSION_KEY] = version
+    cache.set_many(versions, None)
+
+
+def bump_user(user_id):
+    """Избранное, корзина или подписки пользователя изменились."""
+    cache.set(user_version_key(user_id), new_version(), None)
+
+
+def bump_reference():
+    """Инвалидирует все рецепты после изменения тегов или ингредиентов."""
+    cache.set(REFERENCE_VERSION_KEY, new_version(), None)
+
+
+def get_versions(keys):
+    """Версии из общего кэша; отсутствующие создаются через add.
+
+    Если версию одновременно создают несколько процессов, все они
+    получат ту, что записал первый, и ETag у воркеров совпадут.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def increment_counter(key, delta):
+    if not delta:
+        return
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def get_stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+class RecipeRepresentationCache:
+    """Кэш независимой от пользователя части представления рецепта.
+
+    Ключ строится из id рецепта, версий рецепта, автора и справочников
+    (теги, ингредиенты), которые повышаются сигналами при изменениях.
+    """
+
+    def __init__(self, request):
+        host = request.build_absolute_uri("/").encode()
+        self.prefix = (
+            f"recipes:representation:{REPRESENTATION_VERSION}:"
+            f"{hashlib.md5(host).hexdigest()}"
+        )
+        self.keys = {}
+
+    def load_keys(self, recipes):
+        version_keys = {REFERENCE_VERSION_KEY}
+        for recipe in recipes:
+            version_keys.add(recipe_version_key(recipe.id))
+            version_keys.add(author_version_key(recipe.author_id))
+        versions = get_versions(list(version_keys))
+        for recipe in recipes:
+            self.keys[recipe.id] = (
+                f"{self.prefix}:{recipe.id}"
+                f":{versions[recipe_version_key(recipe.id)]}"
+                f":{versions[author_version_key(recipe.author_id)]}"
+                f":{versions[REFERENCE_VERSION_KEY]}"
+            )
+
+    def get_many(self, recipes):
+        self.load_keys(recipes)
+        found = cache.get_many([self.keys[recipe.id] for recipe in recipes])
+        representations = {
+            recipe.id: found[self.keys[recipe.id]]
+            for recipe in recipes
+            if self.keys[recipe.id] in found
+        }
+        increment_counter(HITS_KEY, len(representations))
+        increment_counter(MISSES_KEY, len(recipes) - len(representations))
+        return representations
+
+    def set(self, recipe, representation):
+        if recipe.id not in self.keys:
+            self.load_keys([recipe])
+        cache.set(self.keys[recipe.id], representation)
@@ -5,6 +5,7 @@ MAX_LENGTH_TAG_NAME = 50
 MAX_LENGTH_COLOR_CODE = 7
 MAX_LENGTH_SLUG = 50
 MAX_LENGTH_RECIPE_NAME = 200
+MAX_LENGTH_SHORT_CODE = 10
 
 # Регулярные выражения
 HEX_COLOR_CODE_REGEX = r"^#([A-Fa-f0-9]{6})$"
@@ -15,6 +16,12 @@ MAX_COOKING_TIME = 32_000
 MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 32_000
 
+# Длина кода короткой ссылки
+SHORT_CODE_LENGTH = 6
+
+# Наибольшее число рецептов в одном массовом запросе
+MAX_BULK_RECIPES = 100
+
 # Значения для тестов
 RECIPE_COOKING_TIME = 10
 RECIPE_INGREDIENT_AMOUNT = 100
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.cache import bump_counters
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ).
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "in_carts_count", ShoppingCart, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "subscribers_count", Subscription, "author"),
+)
+
+
+def bump_counted(model, pks):
+    """Счётчики входят в ответы с ETag, поэтому меняют их версию."""
+    if model is Recipe:
+        bump_counters(recipe_ids=pks)
+    else:
+        bump_counters(author_ids=pks)
+
+
+def change_counters(model, pks, field, delta):
+    """Атомарно изменяет счётчики, не опуская их ниже нуля."""
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    queryset.update(**{field: F(field) + delta})
+    bump_counted(model, pks)
+
+
+def change_counter(model, pk, field, delta):
+    change_counters(model, [pk], field, delta)
+
+
+def update_counters(instance, delta):
+    """Учитывает создание (delta=1) или удаление (delta=-1) объекта."""
+    for model, field, counted, foreign_key in COUNTERS:
+        if isinstance(instance, counted):
+            pk = getattr(instance, f"{foreign_key}_id")
+            change_counter(model, pk, field, delta)
+
+
+def update_counters_bulk(counted, foreign_key_ids, delta):
+    """То же для массовых операций, которые не отправляют сигналов.
+
+    Каждый id в ``foreign_key_ids`` должен встречаться один раз.
+    """
+    for model, field, counted_model, _ in COUNTERS:
+        if counted_model is counted:
+            change_counters(model, foreign_key_ids, field, delta)
+
+
+def actual_count(counted, foreign_key):
+    return Coalesce(
+        Subquery(
+            counted.objects.filter(**{foreign_key: OuterRef("pk")})
+            .order_by()
+            .values(foreign_key)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def recount():
+    """Исправляет разошедшиеся счётчики, возвращает число исправлений."""
+    fixed = {}
+    for model, field, counted, foreign_key in COUNTERS:
+        count = actual_count(counted, foreign_key)
+        pks = list(
+            model.objects.exclude(**{field: count}).values_list(
+                "pk", flat=True
+            )
+        )
+        fixed[field] = model.objects.filter(pk__in=pks).update(
+            **{field: count}
+        )
+        bump_counted(model, pks)
+    return fixed
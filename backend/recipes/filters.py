@@ -1,7 +1,8 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 
 
 class IngredientFilter(SearchFilter):
@@ -17,6 +18,7 @@ class RecipeFilter(FilterSet):
         field_name="tags__slug",
         to_field_name="slug",
         queryset=Tag.objects.all(),
+        method="filter_tags",
     )
     is_favorited = filters.NumberFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.NumberFilter(
@@ -32,16 +34,35 @@ class RecipeFilter(FilterSet):
             "is_in_shopping_cart",
         )
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"), tag__in=value
+                )
+            )
+        )
+
+    def filter_by_user_relation(self, queryset, model, related_name, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        if value:
+            # (user, recipe) уникальна, поэтому JOIN не даёт дублей
+            # и позволяет начинать план с короткого списка пользователя.
+            return queryset.filter(**{f"{related_name}__user": user})
+        return queryset.filter(
+            ~Exists(model.objects.filter(user=user, recipe=OuterRef("pk")))
+        )
+
     def filter_is_favorited(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(favorited_by__user=self.request.user)
-        if not value and self.request.user.is_authenticated:
-            return queryset.exclude(favorited_by__user=self.request.user)
-        return queryset
+        return self.filter_by_user_relation(
+            queryset, Favorite, "favorited_by", value
+        )
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(in_shopping_cart__user=self.request.user)
-        if not value and self.request.user.is_authenticated:
-            return queryset.exclude(in_shopping_cart__user=self.request.user)
-        return queryset
+        return self.filter_by_user_relation(
+            queryset, ShoppingCart, "in_shopping_cart", value
+        )
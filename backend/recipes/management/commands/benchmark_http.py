@@ -0,0 +1,89 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_PATHS = (
+    "/api/recipes/",
+    "/api/recipes/?tags=bench-0",
+    "/api/ingredients/?name=а",
+    "/api/tags/",
+    "/api/users/subscriptions/",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает запущенный сервер параллельными GET-запросами и "
+        "выводит пропускную способность и перцентили задержки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000",
+            help="Адрес запущенного сервера",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Путь для замера, можно указать несколько раз",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Количество одновременных клиентов",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="Количество запросов на каждый путь",
+        )
+        parser.add_argument(
+            "--token",
+            default="",
+            help="Токен пользователя для заголовка Authorization",
+        )
+
+    def handle(self, *args, **options):
+        # Заголовок, который добавляет nginx, иначе сработает
+        # SECURE_SSL_REDIRECT.
+        headers = {"Accept": "application/json", "X-Forwarded-Proto": "https"}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        for path in options["paths"] or DEFAULT_PATHS:
+            self.stdout.write(self.style.MIGRATE_HEADING(path))
+            self.measure(
+                options["url"] + quote(path, safe="/?=&,"), headers, options
+            )
+
+    def measure(self, url, headers, options):
+        def fetch(_):
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers), timeout=60) as r:
+                    r.read()
+                    ok = r.status == 200
+            except (HTTPError, URLError, OSError):
+                ok = False
+            return ok, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            results = list(executor.map(fetch, range(options["requests"])))
+        elapsed = time.perf_counter() - start
+        timings = sorted(timing for _, timing in results)
+        errors = sum(1 for ok, _ in results if not ok)
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"  {len(results) / elapsed:.0f} запр/с, "
+            f"p50 {quantiles[49]:.1f} мс, p95 {quantiles[94]:.1f} мс, "
+            f"p99 {quantiles[98]:.1f} мс, ошибок {errors}"
+        )
@@ -0,0 +1,200 @@
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+from recipes.filters import RecipeFilter
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from recipes.shopping_list import refresh_shopping_lists
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench"
+BATCH_SIZE = 5000
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает планы и время прежних и текущих фильтров RecipeFilter "
+        "на тестовых данных"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Создать тестовые данные перед замером",
+        )
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=100_000,
+            help="Количество рецептов при --seed",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Количество повторов каждого запроса",
+        )
+        parser.add_argument(
+            "--no-explain",
+            action="store_true",
+            help="Не выводить планы запросов",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(options["recipes"])
+        user = User.objects.filter(username=f"{BENCH_PREFIX}_user").first()
+        if user is None:
+            self.stdout.write(
+                self.style.ERROR("Нет тестовых данных, запустите с --seed.")
+            )
+            return
+        slugs = list(
+            Tag.objects.filter(slug__startswith=BENCH_PREFIX).values_list(
+                "slug", flat=True
+            )[:2]
+        )
+        for title, legacy, current in self.get_scenarios(user, slugs):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for label, queryset in (("legacy", legacy), ("current", current)):
+                self.measure(label, queryset, options)
+
+    def get_scenarios(self, user, slugs):
+        recipes = Recipe.objects.all()
+        request = SimpleNamespace(user=user)
+
+        def filtered(data):
+            return RecipeFilter(data, queryset=recipes, request=request).qs
+
+        return [
+            (
+                f"tags={','.join(slugs)}",
+                recipes.filter(tags__slug__in=slugs).distinct(),
+                filtered({"tags": slugs}),
+            ),
+            (
+                "is_favorited=1",
+                recipes.filter(favorited_by__user=user),
+                filtered({"is_favorited": 1}),
+            ),
+            (
+                "is_favorited=0",
+                recipes.exclude(favorited_by__user=user),
+                filtered({"is_favorited": 0}),
+            ),
+            (
+                "is_in_shopping_cart=0",
+                recipes.exclude(in_shopping_cart__user=user),
+                filtered({"is_in_shopping_cart": 0}),
+            ),
+        ]
+
+    def measure(self, label, queryset, options):
+        timings = []
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            queryset.count()
+            list(queryset.values_list("id", flat=True)[:PAGE_SIZE])
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"  {label}: медиана {statistics.median(timings):.1f} мс, "
+            f"мин {min(timings):.1f} мс"
+        )
+        if options["no_explain"]:
+            return
+        try:
+            plan = queryset.values_list("id", flat=True)[:PAGE_SIZE].explain()
+        except IndexError:
+            # SQLite иногда возвращает пустой план для коротких запросов.
+            plan = "план недоступен"
+        for line in plan.splitlines():
+            self.stdout.write(f"    {line}")
+
+    @transaction.atomic
+    def seed(self, recipes_count):
+        """Дополняет тестовые данные до ``recipes_count`` рецептов.
+
+        Повторный запуск не создаёт пользователей и теги заново. Массовое
+        создание не отправляет сигналов, поэтому счётчики пересчитываются
+        в конце.
+        """
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f"{BENCH_PREFIX}_author_{index}",
+                    email=f"{BENCH_PREFIX}_author_{index}@example.com",
+                    first_name="Bench",
+                    last_name="Author",
+                )
+                for index in range(100)
+            ),
+            ignore_conflicts=True,
+        )
+        authors = list(
+            User.objects.filter(username__startswith=f"{BENCH_PREFIX}_author_")
+        )
+        user, _ = User.objects.get_or_create(
+            username=f"{BENCH_PREFIX}_user",
+            defaults={
+                "email": f"{BENCH_PREFIX}_user@example.com",
+                "first_name": "Bench",
+                "last_name": "User",
+            },
+        )
+        Tag.objects.bulk_create(
+            (
+                Tag(
+                    name=f"{BENCH_PREFIX} {index}",
+                    slug=f"{BENCH_PREFIX}-{index}",
+                    color=f"#{random.randrange(0x1000000):06X}",
+                )
+                for index in range(10)
+            ),
+            ignore_conflicts=True,
+        )
+        tags = list(Tag.objects.filter(slug__startswith=f"{BENCH_PREFIX}-"))
+        created = Recipe.objects.filter(author__in=authors).count()
+        self.stdout.write(
+            f"Создание {max(recipes_count - created, 0)} рецептов..."
+        )
+        while created < recipes_count:
+            size = min(BATCH_SIZE, recipes_count - created)
+            batch = Recipe.objects.bulk_create(
+                Recipe(
+                    author=random.choice(authors),
+                    name=f"{BENCH_PREFIX} recipe {created + index}",
+                    image="recipes/bench.png",
+                    text="Benchmark",
+                    cooking_time=random.randint(1, 120),
+                )
+                for index in range(size)
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+                for recipe in batch
+                for tag in random.sample(tags, 2)
+            )
+            Favorite.objects.bulk_create(
+                Favorite(user=user, recipe=recipe)
+                for recipe in batch
+                if random.random() < 0.05
+            )
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, recipe=recipe)
+                for recipe in batch
+                if random.random() < 0.01
+            )
+            created += size
+            self.stdout.write(f"  {created}/{recipes_count}")
+        refresh_shopping_lists([user.id])
+        recount()
+        self.stdout.write(self.style.SUCCESS("Тестовые данные созданы."))
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from foodgram.image_variants import build_variants, needs_variants
+from recipes.cache import bump_author, bump_recipe
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит недостающие варианты изображений рецептов и аватаров, "
+        "например после import_recipes"
+    )
+
+    def handle(self, *args, **options):
+        targets = (
+            (
+                Recipe,
+                "image",
+                "image_variants",
+                settings.RECIPE_IMAGE_VARIANTS,
+                bump_recipe,
+            ),
+            (
+                User,
+                "avatar",
+                "avatar_variants",
+                settings.AVATAR_VARIANTS,
+                bump_author,
+            ),
+        )
+        for model, image_field, variants_field, sizes, callback in targets:
+            built = 0
+            queryset = (
+                model.objects.exclude(**{image_field: ""})
+                .exclude(**{f"{image_field}__isnull": True})
+                .only("pk", image_field, variants_field)
+            )
+            for instance in queryset.iterator(chunk_size=500):
+                if not needs_variants(instance, image_field, variants_field):
+                    continue
+                build_variants(
+                    model,
+                    instance.pk,
+                    getattr(instance, image_field).name,
+                    image_field,
+                    variants_field,
+                    sizes,
+                    callback,
+                )
+                built += 1
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: обработано {built}"
+            )
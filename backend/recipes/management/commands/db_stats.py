@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.db.pool import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает метрики получения соединений с БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Сбросить счётчики после вывода",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        acquires = stats["acquires"]
+        connects = stats["connects"]
+        acquire = stats["acquire_us"] / acquires if acquires else 0
+        connect = stats["connect_us"] / connects if connects else 0
+        reused = 1 - connects / acquires if acquires else 0
+        saturated = stats["waits"] / acquires if acquires else 0
+        self.stdout.write(
+            f"Получений: {acquires}, новых соединений: {connects}, "
+            f"повторно использовано: {reused:.1%}, "
+            f"среднее получение: {acquire:.0f} мкс, "
+            f"среднее подключение: {connect:.0f} мкс"
+        )
+        self.stdout.write(
+            f"Ожиданий пула: {stats['waits']} ({saturated:.1%}), "
+            f"таймаутов: {stats['timeouts']}, "
+            f"закрыто непригодных: {stats['discards']}"
+        )
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики сброшены."))
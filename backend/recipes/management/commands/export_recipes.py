@@ -0,0 +1,108 @@
+import base64
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from recipes.models import Amount, Recipe
+
+
+class Command(BaseCommand):
+    help = "Выгружает рецепты в NDJSON: один рецепт на строку"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default="-",
+            help="Файл для записи, «-» — стандартный вывод",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Количество рецептов, читаемых из курсора за раз",
+        )
+        parser.add_argument(
+            "--no-images",
+            action="store_true",
+            help="Не встраивать изображения, только путь в хранилище",
+        )
+
+    def handle(self, *args, **options):
+        recipes = (
+            Recipe.objects.select_related("author")
+            .prefetch_related(
+                "tags",
+                Prefetch(
+                    "amounts",
+                    queryset=Amount.objects.select_related("ingredient"),
+                ),
+            )
+            .order_by("id")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        if options["path"] == "-":
+            self.export(recipes, sys.stdout, options)
+            return
+        try:
+            with open(options["path"], "w", encoding="utf-8") as file:
+                exported = self.export(recipes, file, options)
+        except OSError as error:
+            raise CommandError(f"Не удалось записать файл: {error}")
+        self.stderr.write(
+            self.style.SUCCESS(f"Выгружено рецептов: {exported}")
+        )
+
+    def export(self, recipes, file, options):
+        exported = 0
+        for recipe in recipes:
+            line = json.dumps(
+                self.serialize(recipe, not options["no_images"]),
+                ensure_ascii=False,
+            )
+            file.write(line + "\n")
+            exported += 1
+        return exported
+
+    def serialize(self, recipe, embed_image):
+        image = {"name": recipe.image.name, "content": None}
+        if embed_image and recipe.image:
+            try:
+                with recipe.image.open("rb") as image_file:
+                    image["content"] = base64.b64encode(
+                        image_file.read()
+                    ).decode()
+            except (FileNotFoundError, OSError):
+                self.stderr.write(
+                    self.style.WARNING(
+                        f"Нет файла изображения: {recipe.image.name}"
+                    )
+                )
+        author = recipe.author
+        return {
+            "name": recipe.name,
+            "text": recipe.text,
+            "cooking_time": recipe.cooking_time,
+            "pub_date": recipe.pub_date.isoformat(),
+            "author": {
+                "email": author.email,
+                "username": author.username,
+                "first_name": author.first_name,
+                "last_name": author.last_name,
+            },
+            "tags": [
+                {"slug": tag.slug, "name": tag.name, "color": tag.color}
+                for tag in recipe.tags.all()
+            ],
+            "ingredients": [
+                {
+                    "name": amount.ingredient.name,
+                    "measurement_unit": amount.ingredient.measurement_unit,
+                    "amount": amount.amount,
+                }
+                for amount in recipe.amounts.all()
+            ],
+            "image": image,
+        }
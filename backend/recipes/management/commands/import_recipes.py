@@ -0,0 +1,248 @@
+import base64
+import binascii
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import bump_recipes, bump_reference
+from recipes.counters import change_counter
+from recipes.models import Amount, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+REQUIRED_FIELDS = (
+    "name",
+    "text",
+    "cooking_time",
+    "pub_date",
+    "author",
+    "tags",
+    "ingredients",
+    "image",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает рецепты из NDJSON, созданного export_recipes, "
+        "с продолжением с контрольной точки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON-файл с рецептами")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество рецептов в одной транзакции",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help=(
+                "Файл контрольной точки (по умолчанию <path>.checkpoint); "
+                "удаляется после успешной загрузки"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint"
+        start_line = self.read_checkpoint(checkpoint)
+        if start_line:
+            self.stdout.write(f"Продолжение после строки {start_line}")
+        imported = skipped = 0
+        try:
+            with open(path, encoding="utf-8") as file:
+                lines = islice(enumerate(file, 1), start_line, None)
+                while batch := list(islice(lines, options["batch_size"])):
+                    items = [
+                        self.parse(number, line)
+                        for number, line in batch
+                        if line.strip()
+                    ]
+                    with transaction.atomic():
+                        created, duplicates = self.import_batch(items)
+                    imported += created
+                    skipped += duplicates
+                    self.write_checkpoint(checkpoint, batch[-1][0])
+                    self.stdout.write(
+                        f"Строка {batch[-1][0]}: загружено {imported}, "
+                        f"пропущено {skipped}"
+                    )
+        except FileNotFoundError:
+            raise CommandError(f"Файл не найден: {path}")
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: загружено {imported}, "
+                f"пропущено как дубликаты {skipped}."
+            )
+        )
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint, encoding="utf-8") as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError(
+                f"Повреждён файл контрольной точки: {checkpoint}"
+            )
+
+    def write_checkpoint(self, checkpoint, line_number):
+        with open(checkpoint, "w", encoding="utf-8") as file:
+            file.write(str(line_number))
+
+    def parse(self, number, line):
+        try:
+            item = json.loads(line)
+            missing = [field for field in REQUIRED_FIELDS if field not in item]
+            if missing or "email" not in item["author"]:
+                raise ValueError(f"нет полей {missing or ['author.email']}")
+            item["pub_date"] = datetime.fromisoformat(item["pub_date"])
+            return item
+        except (ValueError, TypeError) as error:
+            raise CommandError(f"Строка {number}: {error}")
+
+    def import_batch(self, items):
+        authors = self.resolve_authors(items)
+        tags = self.resolve_tags(items)
+        ingredients = self.resolve_ingredients(items)
+        existing = set(
+            Recipe.objects.filter(
+                author__in=authors.values(),
+                name__in={item["name"] for item in items},
+            ).values_list("author_id", "name", "pub_date")
+        )
+        new_items = []
+        recipes = []
+        for item in items:
+            author = authors[item["author"]["email"]]
+            key = (author.id, item["name"], item["pub_date"])
+            if key in existing:
+                continue
+            existing.add(key)
+            new_items.append(item)
+            recipes.append(
+                Recipe(
+                    author=author,
+                    name=item["name"],
+                    text=item["text"],
+                    cooking_time=item["cooking_time"],
+                    image=self.save_image(item["image"]),
+                )
+            )
+        Recipe.objects.bulk_create(recipes)
+        # auto_now_add перезаписывает pub_date при вставке.
+        for recipe, item in zip(recipes, new_items):
+            recipe.pub_date = item["pub_date"]
+        Recipe.objects.bulk_update(recipes, ["pub_date"])
+        Amount.objects.bulk_create(
+            Amount(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (ingredient["name"], ingredient["measurement_unit"])
+                ],
+                amount=ingredient["amount"],
+            )
+            for recipe, item in zip(recipes, new_items)
+            for ingredient in item["ingredients"]
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tags[tag["slug"]])
+            for recipe, item in zip(recipes, new_items)
+            for tag in item["tags"]
+        )
+        bump_recipes([recipe.id for recipe in recipes])
+        # bulk_create не отправляет сигналов, счётчики обновляются здесь.
+        for author_id, count in Counter(
+            recipe.author_id for recipe in recipes
+        ).items():
+            change_counter(User, author_id, "recipes_count", count)
+        return len(recipes), len(items) - len(recipes)
+
+    def resolve_authors(self, items):
+        data = {item["author"]["email"]: item["author"] for item in items}
+        authors = {
+            user.email: user for user in User.objects.filter(email__in=data)
+        }
+        missing = [email for email in data if email not in authors]
+        taken = set(
+            User.objects.filter(
+                username__in=[data[email]["username"] for email in missing]
+            ).values_list("username", flat=True)
+        )
+        for email in missing:
+            author = data[email]
+            username = author["username"]
+            if username in taken:
+                username = email
+            taken.add(username)
+            authors[email] = User.objects.create(
+                email=email,
+                username=username,
+                first_name=author.get("first_name", ""),
+                last_name=author.get("last_name", ""),
+                password=make_password(None),
+            )
+        return authors
+
+    def resolve_tags(self, items):
+        data = {tag["slug"]: tag for item in items for tag in item["tags"]}
+        tags = {tag.slug: tag for tag in Tag.objects.filter(slug__in=data)}
+        missing = data.keys() - tags.keys()
+        for slug in missing:
+            tags[slug] = Tag.objects.create(
+                slug=slug, name=data[slug]["name"], color=data[slug]["color"]
+            )
+        if missing:
+            bump_reference()
+        return tags
+
+    def resolve_ingredients(self, items):
+        keys = {
+            (ingredient["name"], ingredient["measurement_unit"])
+            for item in items
+            for ingredient in item["ingredients"]
+        }
+        names = {name for name, _ in keys}
+
+        def load():
+            return {
+                (ingredient.name, ingredient.measurement_unit): ingredient
+                for ingredient in Ingredient.objects.filter(name__in=names)
+            }
+
+        ingredients = load()
+        missing = keys - ingredients.keys()
+        if missing:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in missing
+                ),
+                ignore_conflicts=True,
+            )
+            bump_reference()
+            ingredients = load()
+        return ingredients
+
+    def save_image(self, image):
+        if not image.get("content"):
+            return image["name"]
+        try:
+            content = base64.b64decode(image["content"], validate=True)
+        except binascii.Error:
+            raise CommandError(f"Повреждено изображение {image['name']}")
+        return default_storage.save(image["name"], ContentFile(content))
@@ -1,32 +1,231 @@
 import csv
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
-from django.conf import settings
+import io
+import json
 import os
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.cache import bump_reference
+from recipes.constants import (
+    MAX_LENGTH_INGREDIENT_NAME,
+    MAX_LENGTH_MEASUREMENT_UNIT,
+)
+from recipes.models import Ingredient
+
+READ_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = " \t\r\n,"
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) != 2:
+            yield None, row
+            continue
+        yield (row[0], row[1]), row
+
+
+def read_json(file):
+    """Построчно читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+            position += 1
+        if position == len(buffer) or (started and buffer[position] != "]"):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    if position == len(buffer):
+                        return
+                    raise CommandError("Некорректный JSON-файл.")
+                chunk = file.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            position = end
+            if (
+                isinstance(item, dict)
+                and isinstance(item.get("name"), str)
+                and isinstance(item.get("measurement_unit"), str)
+            ):
+                yield (item["name"], item["measurement_unit"]), item
+            else:
+                yield None, item
+        elif not started:
+            if buffer[position] != "[":
+                raise CommandError("Ожидается JSON-массив ингредиентов.")
+            started = True
+            position += 1
+        else:
+            return
+
+
+READERS = {".csv": read_csv, ".json": read_json}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class Command(BaseCommand):
-    help = "Загружает ингредиенты из CSV-файла"
+    help = "Загружает ингредиенты из CSV- или JSON-файла"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=os.path.join(settings.BASE_DIR, "data", "ingredients.csv"),
+            help="Путь к файлу .csv или .json",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=("skip", "update"),
+            default="skip",
+            help=(
+                "skip — пропускать существующие ингредиенты, update — "
+                "обновлять единицу измерения ингредиента с тем же названием"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество строк в одной транзакции",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Загружать через COPY во временную таблицу (PostgreSQL)",
+        )
 
-    def handle(self, *args, **kwargs):
-        file_path = os.path.join(settings.BASE_DIR, "data", "ingredients.csv")
+    def handle(self, *args, **options):
+        path = options["path"]
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError("Поддерживаются только файлы .csv и .json.")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy доступен только для PostgreSQL.")
+        self.stats = {"read": 0, "invalid": 0, "updated": 0}
+        count_before = Ingredient.objects.count()
         try:
-            with open(file_path, encoding="utf-8") as csvfile:
-                reader = csv.reader(csvfile)
-                #                Ingredient.objects.all().delete()
-                # Опционально: удаляем существующие данные
-                for row in reader:
-                    if len(row) == 2:
-                        name, measurement_unit = row
-                        Ingredient.objects.create(
-                            name=name, measurement_unit=measurement_unit
-                        )
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(f"Неверная строка: {row}")
-                        )
-            self.stdout.write(
-                self.style.SUCCESS("Ингредиенты успешно загружены.")
-            )
+            with open(path, encoding="utf-8") as file:
+                rows = self.validate(READERS[extension](file))
+                load = self.load_copy if options["copy"] else self.load_batch
+                for batch in batched(rows, options["batch_size"]):
+                    with transaction.atomic():
+                        load(batch, options["mode"])
+                    self.stdout.write(
+                        f"Обработано строк: {self.stats['read']}"
+                    )
         except FileNotFoundError:
-            self.stdout.write(self.style.ERROR(f"Файл не найден: {file_path}"))
+            raise CommandError(f"Файл не найден: {path}")
+        finally:
+            bump_reference()
+        created = Ingredient.objects.count() - count_before
+        valid = self.stats["read"] - self.stats["invalid"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: добавлено {created}, "
+                f"обновлено {self.stats['updated']}, "
+                f"пропущено {valid - created - self.stats['updated']}, "
+                f"ошибок {self.stats['invalid']}."
+            )
+        )
+
+    def validate(self, rows):
+        for values, raw in rows:
+            self.stats["read"] += 1
+            if values is not None:
+                name, measurement_unit = (value.strip() for value in values)
+                if (
+                    name
+                    and measurement_unit
+                    and len(name) <= MAX_LENGTH_INGREDIENT_NAME
+                    and len(measurement_unit) <= MAX_LENGTH_MEASUREMENT_UNIT
+                ):
+                    yield name, measurement_unit
+                    continue
+            self.stats["invalid"] += 1
+            self.stdout.write(self.style.ERROR(f"Неверная строка: {raw}"))
+
+    def load_batch(self, batch, mode):
+        rows = set(batch)
+        if mode == "update":
+            rows = self.update_units(rows)
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in rows
+            ),
+            ignore_conflicts=True,
+        )
+
+    def update_units(self, rows):
+        """Обновляет единицы измерения, возвращает строки для вставки."""
+        existing = {}
+        for ingredient in Ingredient.objects.filter(
+            name__in={name for name, _ in rows}
+        ):
+            existing.setdefault(ingredient.name, []).append(ingredient)
+        names = Counter(name for name, _ in rows)
+        to_update = []
+        to_create = set()
+        for name, measurement_unit in rows:
+            matches = existing.get(name, [])
+            if len(matches) == 1 and names[name] == 1:
+                if matches[0].measurement_unit != measurement_unit:
+                    matches[0].measurement_unit = measurement_unit
+                    to_update.append(matches[0])
+            else:
+                to_create.add((name, measurement_unit))
+        Ingredient.objects.bulk_update(to_update, ["measurement_unit"])
+        self.stats["updated"] += len(to_update)
+        return to_create
+
+    def load_copy(self, batch, mode):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE ingredient_staging "
+                f"(name varchar({MAX_LENGTH_INGREDIENT_NAME}), "
+                f"measurement_unit varchar({MAX_LENGTH_MEASUREMENT_UNIT})) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_staging (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            if mode == "update":
+                cursor.execute(
+                    f"UPDATE {table} AS i "
+                    "SET measurement_unit = s.measurement_unit "
+                    "FROM ingredient_staging AS s "
+                    "WHERE i.name = s.name "
+                    "AND i.measurement_unit <> s.measurement_unit "
+                    f"AND (SELECT count(*) FROM {table} AS e "
+                    "WHERE e.name = s.name) = 1 "
+                    "AND (SELECT count(*) FROM ingredient_staging AS d "
+                    "WHERE d.name = s.name) = 1"
+                )
+                self.stats["updated"] += cursor.rowcount
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT DISTINCT name, measurement_unit "
+                "FROM ingredient_staging "
+                "ON CONFLICT (name, measurement_unit) DO NOTHING"
+            )
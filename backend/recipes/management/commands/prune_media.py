@@ -0,0 +1,75 @@
+import os
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+MEDIA_DIRECTORIES = ("recipes", "avatars")
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет медиафайлы, на которые не ссылается ни один рецепт "
+        "или пользователь"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=24,
+            help="Не трогать файлы моложе указанного числа часов",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только вывести список файлов",
+        )
+
+    def handle(self, *args, **options):
+        referenced = self.get_referenced()
+        threshold = timezone.now() - timedelta(hours=options["min_age"])
+        purge = getattr(default_storage, "purge", default_storage.delete)
+        removed = 0
+        for directory in MEDIA_DIRECTORIES:
+            for name in self.walk(directory):
+                if name in referenced:
+                    continue
+                if default_storage.get_modified_time(name) > threshold:
+                    continue
+                self.stdout.write(name)
+                if not options["dry_run"]:
+                    purge(name)
+                removed += 1
+        action = "Найдено" if options["dry_run"] else "Удалено"
+        self.stdout.write(
+            self.style.SUCCESS(f"{action} неиспользуемых файлов: {removed}")
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for model, image_field, variants_field in (
+            (Recipe, "image", "image_variants"),
+            (User, "avatar", "avatar_variants"),
+        ):
+            rows = model.objects.values_list(image_field, variants_field)
+            for image, variants in rows.iterator(chunk_size=2000):
+                if image:
+                    referenced.add(image)
+                referenced.update((variants or {}).values())
+        return referenced
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield os.path.join(directory, name)
+        for child in directories:
+            yield from self.walk(os.path.join(directory, child))
@@ -0,0 +1,39 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.shopping_list import refresh_shopping_lists
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает предрассчитанные списки покупок пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="id пользователя; по умолчанию все пользователи",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Количество пользователей в одной транзакции",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options["users"]
+        if user_ids is None:
+            user_ids = ShoppingCart.objects.values_list(
+                "user_id", flat=True
+            ).union(ShoppingListItem.objects.values_list("user_id", flat=True))
+        user_ids = iter(user_ids)
+        rebuilt = 0
+        while batch := list(islice(user_ids, options["batch_size"])):
+            refresh_shopping_lists(batch)
+            rebuilt += len(batch)
+            self.stdout.write(f"Пересчитано списков: {rebuilt}")
+        self.stdout.write(self.style.SUCCESS("Списки покупок пересчитаны."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает счётчики попаданий в кэш представлений рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Сбросить счётчики после вывода",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"Попадания: {stats['hits']}, промахи: {stats['misses']}, "
+            f"доля попаданий: {ratio:.1%}"
+        )
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики сброшены."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счётчики избранного, корзин, рецептов и подписчиков"
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        for field, count in fixed.items():
+            self.stdout.write(f"{field}: исправлено {count}")
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.short_links import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает статистику разрешения коротких ссылок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Сбросить счётчики после вывода",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = stats["hits"] + stats["misses"] + stats["not_found"]
+        ratio = stats["hits"] / total if total else 0
+        latency = stats["latency_us"] / total if total else 0
+        self.stdout.write(
+            f"Попадания: {stats['hits']}, промахи: {stats['misses']}, "
+            f"не найдено: {stats['not_found']}, "
+            f"доля попаданий: {ratio:.1%}, "
+            f"среднее время: {latency:.0f} мкс"
+        )
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики сброшены."))
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0006_shoppinglistitem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="short_code",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=10,
+                null=True,
+                unique=True,
+                verbose_name="Код короткой ссылки",
+            ),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.core.validators import (
 )
 from django.contrib.auth import get_user_model
 
+from foodgram.models import ManagedFieldsMixin
 from .constants import (
     MAX_LENGTH_INGREDIENT_NAME,
     MAX_LENGTH_MEASUREMENT_UNIT,
@@ -18,6 +19,7 @@ from .constants import (
     MAX_COOKING_TIME,
     MIN_INGREDIENT_AMOUNT,
     MAX_INGREDIENT_AMOUNT,
+    MAX_LENGTH_SHORT_CODE,
 )
 
 User = get_user_model()
@@ -72,7 +74,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(ManagedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -83,6 +85,12 @@ class Recipe(models.Model):
         max_length=MAX_LENGTH_RECIPE_NAME, verbose_name="Название"
     )
     image = models.ImageField(upload_to="recipes/", verbose_name="Изображение")
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Варианты изображения",
+    )
     text = models.TextField(verbose_name="Описание")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -103,9 +111,35 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name="Дата публикации"
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В избранном"
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В корзинах"
+    )
+    short_code = models.CharField(
+        max_length=MAX_LENGTH_SHORT_CODE,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Код короткой ссылки",
+    )
+
+    managed_fields = (
+        "favorites_count",
+        "in_carts_count",
+        "short_code",
+        "image_variants",
+    )
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"
+            ),
+        ]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
@@ -187,3 +221,29 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"{self.user.username} -> {self.recipe.name}"
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    total = models.PositiveIntegerField(verbose_name="Количество")
+
+    class Meta:
+        unique_together = ("user", "ingredient")
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Списки покупок"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.ingredient.name} - {self.total}"
@@ -0,0 +1,184 @@
+import zlib
+from functools import lru_cache
+
+from reportlab.pdfbase.ttfonts import (
+    FF_NONSYMBOLIC,
+    FF_SYMBOLIC,
+    SUBSETN,
+    TTFont,
+    makeToUnicodeCMap,
+)
+
+# A4 в пунктах.
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+
+CATALOG_ID = 1
+PAGES_ID = 2
+RESOURCES_ID = 3
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    return TTFont("ShoppingList", path)
+
+
+def number(value):
+    return b"%g" % round(value, 3)
+
+
+class StreamingPDF:
+    """PDF, который отдаётся страница за страницей.
+
+    Страницы пишутся сразу и ссылаются на дерево страниц и ресурсы с
+    заранее выбранными номерами. Подмножества встроенного TrueType
+    шрифта, дерево страниц и таблица xref пишутся в ``finish``, когда
+    известны все использованные символы.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = RESOURCES_ID + 1
+        self.page_ids = []
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def write(self, data):
+        self.offset += len(data)
+        return data
+
+    def header(self):
+        return self.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def object(self, object_id, body):
+        self.offsets[object_id] = self.offset
+        return self.write(b"%d 0 obj\n%s\nendobj\n" % (object_id, body))
+
+    def stream(self, object_id, content, extra=b""):
+        content = zlib.compress(content)
+        return self.object(
+            object_id,
+            b"<< /Length %d /Filter /FlateDecode%s >>\nstream\n%s\nendstream"
+            % (len(content), extra, content),
+        )
+
+    def string_width(self, text, size):
+        return self.font.stringWidth(text, size)
+
+    def text(self, x, y, size, text):
+        """Вывод строки; каждая часть идёт шрифтом своего подмножества."""
+        parts = [b"BT %s %s Td" % (number(x), number(y))]
+        for subset, data in self.font.splitString(text, self):
+            parts.append(
+                b"/F%d %d Tf <%s> Tj" % (subset, size, data.hex().encode())
+            )
+        parts.append(b"ET")
+        return b" ".join(parts)
+
+    def page(self, operations):
+        content_id = self.new_id()
+        page_id = self.new_id()
+        self.page_ids.append(page_id)
+        return self.stream(content_id, b"\n".join(operations)) + self.object(
+            page_id,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources %d 0 R /Contents %d 0 R >>"
+            % (PAGES_ID, PAGE_WIDTH, PAGE_HEIGHT, RESOURCES_ID, content_id),
+        )
+
+    def font_objects(self):
+        state = self.font.state.pop(self, None)
+        subsets = state.subsets if state is not None else []
+        face = self.font.face
+        flags = face.flags & ~FF_NONSYMBOLIC | FF_SYMBOLIC
+        chunks = []
+        fonts = []
+        for index, subset in enumerate(subsets):
+            name = SUBSETN(index) + b"+" + face.name + face.subfontNameX
+            file_id, descriptor_id, cmap_id, font_id = (
+                self.new_id() for _ in range(4)
+            )
+            font_file = face.makeSubset(subset)
+            chunks.append(
+                self.stream(
+                    file_id, font_file, b" /Length1 %d" % len(font_file)
+                )
+            )
+            chunks.append(
+                self.object(
+                    descriptor_id,
+                    b"<< /Type /FontDescriptor /FontName /%s /Flags %d "
+                    b"/FontBBox [%s] /ItalicAngle %s /Ascent %s "
+                    b"/Descent %s /CapHeight %s /StemV %s "
+                    b"/MissingWidth %s /FontFile2 %d 0 R >>"
+                    % (
+                        name,
+                        flags,
+                        b" ".join(number(value) for value in face.bbox),
+                        number(face.italicAngle),
+                        number(face.ascent),
+                        number(face.descent),
+                        number(face.capHeight),
+                        number(face.stemV),
+                        number(face.defaultWidth),
+                        file_id,
+                    ),
+                )
+            )
+            chunks.append(
+                self.stream(
+                    cmap_id, makeToUnicodeCMap(name.decode(), subset).encode()
+                )
+            )
+            chunks.append(
+                self.object(
+                    font_id,
+                    b"<< /Type /Font /Subtype /TrueType /BaseFont /%s "
+                    b"/FirstChar 0 /LastChar %d /Widths [%s] "
+                    b"/FontDescriptor %d 0 R /ToUnicode %d 0 R >>"
+                    % (
+                        name,
+                        len(subset) - 1,
+                        b" ".join(
+                            number(face.getCharWidth(code)) for code in subset
+                        ),
+                        descriptor_id,
+                        cmap_id,
+                    ),
+                )
+            )
+            fonts.append(b"/F%d %d 0 R" % (index, font_id))
+        chunks.append(
+            self.object(
+                RESOURCES_ID, b"<< /Font << %s >> >>" % b" ".join(fonts)
+            )
+        )
+        return b"".join(chunks)
+
+    def finish(self):
+        """Шрифты, дерево страниц, каталог и таблица xref."""
+        data = self.font_objects()
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        data += self.object(
+            PAGES_ID,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>"
+            % (kids, len(self.page_ids)),
+        )
+        data += self.object(
+            CATALOG_ID, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGES_ID
+        )
+        xref_offset = self.offset
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id]
+        xref.extend(
+            b"%010d 00000 n \n" % self.offsets[object_id]
+            for object_id in range(1, self.next_id)
+        )
+        trailer = (
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self.next_id, CATALOG_ID, xref_offset)
+        )
+        return data + self.write(b"".join(xref) + trailer)
@@ -0,0 +1,92 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.cache import REFERENCE_VERSION_KEY, get_versions
+from recipes.models import Ingredient, Tag
+
+
+class ReferenceSnapshot:
+    """Неизменяемый снимок ингредиентов и тегов в памяти процесса.
+
+    Ингредиенты отсортированы по названию без учёта регистра, поэтому
+    поиск по префиксу сводится к двоичному поиску.
+    """
+
+    def __init__(self, version, ingredients=None, tags=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        if ingredients is None:
+            ingredients = Ingredient.objects.all()
+        if tags is None:
+            tags = Tag.objects.order_by("id")
+        self.ingredients = sorted(
+            ingredients,
+            key=lambda ingredient: (ingredient.name.casefold(), ingredient.id),
+        )
+        self.ingredient_names = [
+            ingredient.name.casefold() for ingredient in self.ingredients
+        ]
+        self.ingredients_by_id = {
+            ingredient.id: ingredient for ingredient in self.ingredients
+        }
+        self.tags = list(tags)
+        self.tags_by_id = {tag.id: tag for tag in self.tags}
+
+    def search_ingredients(self, prefix):
+        prefix = prefix.casefold()
+        start = bisect_left(self.ingredient_names, prefix)
+        result = []
+        for index in range(start, len(self.ingredient_names)):
+            if not self.ingredient_names[index].startswith(prefix):
+                break
+            result.append(self.ingredients[index])
+        return result
+
+    def is_fresh(self, version):
+        return (
+            self.version == version
+            and time.monotonic() - self.loaded_at
+            < settings.REFERENCE_SNAPSHOT_TTL
+        )
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_reference_snapshot():
+    """Возвращает снимок, перечитывая таблицы после смены версии.
+
+    Версия справочников повышается сигналами при изменении тегов и
+    ингредиентов (см. recipes.signals) и хранится в общем кэше. Если
+    версию повысили мимо него (например, в shell с LocMemCache), снимок
+    всё равно перечитывается через ``REFERENCE_SNAPSHOT_TTL`` секунд.
+    """
+    global _snapshot
+    version = get_versions([REFERENCE_VERSION_KEY])[REFERENCE_VERSION_KEY]
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh(version):
+        return snapshot
+    with _lock:
+        if _snapshot is None or not _snapshot.is_fresh(version):
+            _snapshot = ReferenceSnapshot(version)
+        return _snapshot
+
+
+async def aget_reference_snapshot():
+    """get_reference_snapshot для асинхронных представлений."""
+    global _snapshot
+    version = get_versions([REFERENCE_VERSION_KEY])[REFERENCE_VERSION_KEY]
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh(version):
+        return snapshot
+    snapshot = ReferenceSnapshot(
+        version,
+        [ingredient async for ingredient in Ingredient.objects.all()],
+        [tag async for tag in Tag.objects.order_by("id")],
+    )
+    _snapshot = snapshot
+    return snapshot
@@ -1,8 +1,43 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from recipes.models import Recipe, Ingredient, Tag, Amount
 from drf_extra_fields.fields import Base64ImageField
 
+from foodgram.image_variants import ImageVariantsField
+from foodgram.uploads import UploadedImageField
+from recipes.cache import RecipeRepresentationCache, bump_recipe
+from recipes.constants import MAX_BULK_RECIPES
+from recipes.reference import get_reference_snapshot
+from recipes.shopping_list import (
+    defer_recipe_refresh,
+    refresh_recipe_shopping_lists,
+)
 from users.serializers import UserSerializer
+from users.subscriptions import (
+    SubscriptionPrimingListSerializer,
+    get_subscription_cache,
+)
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Проверяет id тега или ингредиента по снимку справочников."""
+
+    def __init__(self, snapshot_attr, **kwargs):
+        self.snapshot_attr = snapshot_attr
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        objects = getattr(get_reference_snapshot(), self.snapshot_attr)
+        if pk not in objects:
+            self.fail("does_not_exist", pk_value=data)
+        return objects[pk]
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -25,8 +60,10 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class AmountSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source="ingredient"
+    id = ReferencePrimaryKeyRelatedField(
+        "ingredients_by_id",
+        queryset=Ingredient.objects.all(),
+        source="ingredient",
     )
     name = serializers.ReadOnlyField(source="ingredient.name")
     measurement_unit = serializers.ReadOnlyField(
@@ -38,12 +75,28 @@ class AmountSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+COUNTER_FIELDS = ("favorites_count", "in_carts_count")
+AUTHOR_COUNTER_FIELDS = ("recipes_count", "subscribers_count")
+
+
+class RecipeListSerializer(SubscriptionPrimingListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        self.child.cached_representations = (
+            self.child.get_representation_cache().get_many(items)
+        )
+        return super().to_representation(items)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField(
+        "image", "image_variants", settings.RECIPE_IMAGE_VARIANTS
+    )
     author = UserSerializer(read_only=True)
     ingredients = AmountSerializer(many=True, source="amounts")
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
+    tags = ReferencePrimaryKeyRelatedField(
+        "tags_by_id", queryset=Tag.objects.all(), many=True
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -55,21 +108,41 @@ class RecipeSerializer(serializers.ModelSerializer):
             "author",
             "name",
             "image",
+            "image_variants",
             "text",
             "ingredients",
             "tags",
             "cooking_time",
             "is_favorited",
             "is_in_shopping_cart",
+            "favorites_count",
+            "in_carts_count",
         )
+        list_serializer_class = RecipeListSerializer
+
+    cached_representations = None
+
+    def get_representation_cache(self):
+        if not hasattr(self, "_representation_cache"):
+            self._representation_cache = RecipeRepresentationCache(
+                self.context["request"]
+            )
+        return self._representation_cache
+
+    def get_author_ids(self, recipes):
+        return [recipe.author_id for recipe in recipes]
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         user = self.context["request"].user
         if user.is_authenticated:
             return obj.favorited_by.filter(user=user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         user = self.context["request"].user
         if user.is_authenticated:
             return obj.in_shopping_cart.filter(user=user).exists()
@@ -86,14 +159,17 @@ class RecipeSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop("amounts")
         tags_data = validated_data.pop("tags")
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        if tags_data:
-            instance.tags.set(tags_data)
-        if ingredients_data:
-            instance.amounts.all().delete()
-            self.create_ingredients(instance, ingredients_data)
+        # Списки покупок не видят рецепт без ингредиентов и
+        # пересчитываются один раз после замены.
+        with transaction.atomic(), defer_recipe_refresh(instance.id):
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            if tags_data:
+                instance.tags.set(tags_data)
+            if ingredients_data:
+                instance.amounts.all().delete()
+                self.create_ingredients(instance, ingredients_data)
         return instance
 
     def create_ingredients(self, recipe, ingredients_data):
@@ -105,15 +181,36 @@ class RecipeSerializer(serializers.ModelSerializer):
                 Amount(recipe=recipe, ingredient=ingredient, amount=amount)
             )
         Amount.objects.bulk_create(amounts)
+        bump_recipe(recipe.id)
+        refresh_recipe_shopping_lists(
+            recipe.id, [amount.ingredient_id for amount in amounts]
+        )
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation["tags"] = TagSerializer(
-            instance.tags.all(), many=True
-        ).data
-        representation["ingredients"] = AmountSerializer(
-            instance.amounts.all(), many=True
-        ).data
+        representation_cache = self.get_representation_cache()
+        cached = self.cached_representations
+        if cached is None:
+            cached = representation_cache.get_many([instance])
+        representation = cached.get(instance.id)
+        if representation is None:
+            representation = super().to_representation(instance)
+            representation["tags"] = TagSerializer(
+                instance.tags.all(), many=True
+            ).data
+            representation_cache.set(instance, representation)
+            return representation
+        representation["is_favorited"] = self.get_is_favorited(instance)
+        representation["is_in_shopping_cart"] = self.get_is_in_shopping_cart(
+            instance
+        )
+        representation["author"]["is_subscribed"] = get_subscription_cache(
+            self.context["request"]
+        ).is_subscribed(instance.author_id)
+        # Счётчики меняются часто и читаются из той же строки запроса.
+        for field in COUNTER_FIELDS:
+            representation[field] = getattr(instance, field)
+        for field in AUTHOR_COUNTER_FIELDS:
+            representation["author"][field] = getattr(instance.author, field)
         return representation
 
     def validate(self, data):
@@ -144,3 +241,22 @@ class RecipeSerializer(serializers.ModelSerializer):
                 {"image": "Это поле обязательно."}
             )
         return data
+
+
+class RecipeImageSerializer(serializers.ModelSerializer):
+    image = UploadedImageField()
+    image_variants = ImageVariantsField(
+        "image", "image_variants", settings.RECIPE_IMAGE_VARIANTS
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ("image", "image_variants")
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+    )
@@ -0,0 +1,247 @@
+import csv
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.models import Amount, ShoppingCart, ShoppingListItem
+from recipes.pdf import PAGE_HEIGHT, PAGE_WIDTH, StreamingPDF, load_font
+
+User = get_user_model()
+
+CHUNK_SIZE = 500
+
+deferred_refresh = ContextVar("deferred_refresh", default=None)
+CSV_HEADER = ("Ингредиент", "Единица измерения", "Количество")
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class TextRenderer:
+    content_type = "text/plain; charset=utf-8"
+    extension = "txt"
+
+    def render(self, ingredients):
+        for ingredient in ingredients:
+            yield (
+                f"{ingredient['ingredient__name']} "
+                f"({ingredient['ingredient__measurement_unit']}) - "
+                f"{ingredient['total_amount']}\n"
+            )
+
+
+class CSVRenderer:
+    content_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    def render(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_HEADER)
+        for ingredient in ingredients:
+            yield writer.writerow(
+                [
+                    ingredient["ingredient__name"],
+                    ingredient["ingredient__measurement_unit"],
+                    ingredient["total_amount"],
+                ]
+            )
+
+
+class PDFRenderer:
+    """Список покупок в PDF со встроенным шрифтом SHOPPING_LIST_PDF_FONT.
+
+    Каждая страница отдаётся клиенту, как только набраны её строки.
+    """
+
+    content_type = "application/pdf"
+    extension = "pdf"
+    title = "Список покупок"
+    font_size = 11
+    title_size = 16
+    line_height = 18
+    margin = 50
+
+    def render(self, ingredients):
+        pdf = StreamingPDF(load_font(settings.SHOPPING_LIST_PDF_FONT))
+        yield pdf.header()
+        rows_per_page = (
+            int((PAGE_HEIGHT - 2 * self.margin) / self.line_height) - 2
+        )
+        rows = []
+        for ingredient in ingredients:
+            rows.append(ingredient)
+            if len(rows) == rows_per_page:
+                yield self.page(pdf, rows)
+                rows = []
+        if rows or not pdf.page_ids:
+            yield self.page(pdf, rows)
+        yield pdf.finish()
+
+    def page(self, pdf, rows):
+        right = PAGE_WIDTH - self.margin
+        y = PAGE_HEIGHT - self.margin - self.title_size
+        operations = [pdf.text(self.margin, y, self.title_size, self.title)]
+        y -= 2 * self.line_height
+        for row in rows:
+            total = str(row["total_amount"])
+            width = (
+                right
+                - self.margin
+                - 20
+                - pdf.string_width(total, self.font_size)
+            )
+            operations.append(
+                pdf.text(
+                    self.margin,
+                    y,
+                    self.font_size,
+                    self.fit(
+                        pdf,
+                        f"{row['ingredient__name']} "
+                        f"({row['ingredient__measurement_unit']})",
+                        width,
+                    ),
+                )
+            )
+            operations.append(
+                pdf.text(
+                    right - pdf.string_width(total, self.font_size),
+                    y,
+                    self.font_size,
+                    total,
+                )
+            )
+            y -= self.line_height
+        number = str(len(pdf.page_ids) + 1)
+        operations.append(
+            pdf.text(
+                right - pdf.string_width(number, self.font_size),
+                self.margin / 2,
+                self.font_size,
+                number,
+            )
+        )
+        return pdf.page(operations)
+
+    def fit(self, pdf, text, width):
+        if pdf.string_width(text, self.font_size) <= width:
+            return text
+        while text and pdf.string_width(text + "…", self.font_size) > width:
+            text = text[:-1]
+        return text + "…"
+
+
+RENDERERS = {
+    TextRenderer.extension: TextRenderer,
+    CSVRenderer.extension: CSVRenderer,
+    PDFRenderer.extension: PDFRenderer,
+}
+
+
+def get_shopping_list(user):
+    """Список покупок из предрассчитанных сумм ShoppingListItem."""
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            total_amount=F("total"),
+        )
+        .order_by("ingredient__name")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def aggregate_shopping_list(user):
+    """Список покупок, посчитанный по рецептам в корзине."""
+    return (
+        Amount.objects.filter(recipe__in_shopping_cart__user=user)
+        .values("ingredient__name", "ingredient__measurement_unit")
+        .annotate(total_amount=Sum("amount"))
+        .order_by("ingredient__name")
+    )
+
+
+@transaction.atomic
+def refresh_shopping_lists(user_ids, ingredient_ids=None):
+    """Пересчитывает суммы ингредиентов в списках покупок пользователей.
+
+    Без ``ingredient_ids`` списки пересчитываются целиком. Строки
+    пользователей блокируются, чтобы параллельные пересчёты одного
+    списка выполнялись по очереди и видели изменения друг друга.
+    """
+    user_ids = list(
+        User.objects.filter(id__in=user_ids)
+        .order_by("id")
+        .select_for_update()
+        .values_list("id", flat=True)
+    )
+    if not user_ids:
+        return
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+    amounts = Amount.objects.filter(
+        recipe__in_shopping_cart__user_id__in=user_ids
+    )
+    if ingredient_ids is not None:
+        items = items.filter(ingredient_id__in=ingredient_ids)
+        amounts = amounts.filter(ingredient_id__in=ingredient_ids)
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=row["recipe__in_shopping_cart__user"],
+            ingredient_id=row["ingredient"],
+            total=row["total"],
+        )
+        for row in amounts.values(
+            "recipe__in_shopping_cart__user", "ingredient"
+        )
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+
+
+def refresh_recipe_shopping_lists(recipe_id, ingredient_ids=None):
+    """Пересчитывает списки всех, у кого рецепт лежит в корзине."""
+    deferred = deferred_refresh.get()
+    if deferred is not None and deferred["recipe_id"] == recipe_id:
+        if ingredient_ids is None or deferred["ingredient_ids"] is None:
+            deferred["ingredient_ids"] = None
+        else:
+            deferred["ingredient_ids"].update(ingredient_ids)
+        deferred["pending"] = True
+        return
+    refresh_shopping_lists(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            "user_id", flat=True
+        ),
+        ingredient_ids,
+    )
+
+
+@contextmanager
+def defer_recipe_refresh(recipe_id):
+    """Один пересчёт списков по рецепту вместо пересчёта на каждую строку.
+
+    Внутри блока запросы на пересчёт копятся и выполняются при выходе
+    без исключения по всем затронутым ингредиентам.
+    """
+    deferred = {
+        "recipe_id": recipe_id,
+        "ingredient_ids": set(),
+        "pending": False,
+    }
+    token = deferred_refresh.set(deferred)
+    try:
+        yield
+    finally:
+        deferred_refresh.reset(token)
+    if deferred["pending"]:
+        refresh_recipe_shopping_lists(recipe_id, deferred["ingredient_ids"])
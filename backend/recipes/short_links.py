@@ -0,0 +1,140 @@
+import secrets
+import string
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from foodgram.lru import LRUCache
+from recipes.cache import get_versions, increment_counter, new_version
+from recipes.constants import SHORT_CODE_LENGTH
+from recipes.models import Recipe
+
+ALPHABET = string.digits + string.ascii_letters
+CREATE_ATTEMPTS = 5
+STATS_FLUSH_EVERY = 100
+
+HITS_KEY = "short_links:hits"
+MISSES_KEY = "short_links:misses"
+NOT_FOUND_KEY = "short_links:not_found"
+LATENCY_KEY = "short_links:latency_us"
+VERSION_KEY = "short_links:version"
+
+
+def generate_code():
+    return "".join(secrets.choice(ALPHABET) for _ in range(SHORT_CODE_LENGTH))
+
+
+def bump_version():
+    """Сбрасывает LRU всех процессов после удаления рецепта с кодом."""
+    cache.set(VERSION_KEY, new_version(), None)
+
+
+def get_or_create_code(recipe):
+    """Код короткой ссылки рецепта; создаётся при первом обращении."""
+    if recipe.short_code:
+        return recipe.short_code
+    for _ in range(CREATE_ATTEMPTS):
+        code = generate_code()
+        try:
+            with transaction.atomic():
+                updated = Recipe.objects.filter(
+                    pk=recipe.pk, short_code__isnull=True
+                ).update(short_code=code)
+        except IntegrityError:
+            continue
+        if not updated:
+            # Код уже создан параллельным запросом.
+            code = Recipe.objects.values_list("short_code", flat=True).get(
+                pk=recipe.pk
+            )
+        recipe.short_code = code
+        return code
+    raise RuntimeError("Не удалось подобрать свободный код ссылки.")
+
+
+class ShortLinkResolver:
+    """Разрешает код ссылки в id рецепта через LRU процесса.
+
+    Записи LRU помечены версией из общего кэша, которую повышает
+    удаление рецепта, поэтому код удалённого рецепта не разрешается
+    ни в одном процессе. Статистика копится в памяти и раз в
+    ``STATS_FLUSH_EVERY`` обращений переносится в общий кэш.
+    """
+
+    def __init__(self, max_size):
+        self.cache = LRUCache(max_size)
+        self.lock = threading.Lock()
+        self.pending = self.empty_stats()
+
+    @staticmethod
+    def empty_stats():
+        return {
+            HITS_KEY: 0,
+            MISSES_KEY: 0,
+            NOT_FOUND_KEY: 0,
+            LATENCY_KEY: 0,
+        }
+
+    def resolve(self, code):
+        start = time.perf_counter()
+        version = get_versions([VERSION_KEY])[VERSION_KEY]
+        item = self.cache.get(code)
+        if item is not None and item[1] == version:
+            recipe_id = item[0]
+            result = HITS_KEY
+        else:
+            recipe_id = (
+                Recipe.objects.filter(short_code=code)
+                .values_list("id", flat=True)
+                .first()
+            )
+            if recipe_id is None:
+                result = NOT_FOUND_KEY
+            else:
+                result = MISSES_KEY
+                self.cache.set(code, (recipe_id, version))
+        self.record(result, time.perf_counter() - start)
+        return recipe_id
+
+    def record(self, result, elapsed):
+        with self.lock:
+            self.pending[result] += 1
+            self.pending[LATENCY_KEY] += int(elapsed * 1_000_000)
+            total = (
+                self.pending[HITS_KEY]
+                + self.pending[MISSES_KEY]
+                + self.pending[NOT_FOUND_KEY]
+            )
+            if total < STATS_FLUSH_EVERY:
+                return
+            pending, self.pending = self.pending, self.empty_stats()
+        self.flush(pending)
+
+    def flush(self, pending=None):
+        if pending is None:
+            with self.lock:
+                pending, self.pending = self.pending, self.empty_stats()
+        for key, delta in pending.items():
+            increment_counter(key, delta)
+
+
+resolver = ShortLinkResolver(settings.SHORT_LINK_CACHE_SIZE)
+
+
+def get_stats():
+    counters = cache.get_many(
+        [HITS_KEY, MISSES_KEY, NOT_FOUND_KEY, LATENCY_KEY]
+    )
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0),
+        "not_found": counters.get(NOT_FOUND_KEY, 0),
+        "latency_us": counters.get(LATENCY_KEY, 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY, NOT_FOUND_KEY, LATENCY_KEY])
@@ -1,8 +1,15 @@
+from django.conf import settings
 from rest_framework import serializers
+
+from foodgram.image_variants import ImageVariantsField
 from recipes.models import Recipe
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(
+        "image", "image_variants", settings.RECIPE_IMAGE_VARIANTS
+    )
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
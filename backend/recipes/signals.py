@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from foodgram.image_variants import needs_variants, schedule_variants
+from recipes.cache import (
+    bump_author,
+    bump_recipe,
+    bump_reference,
+    bump_user,
+)
+from recipes.counters import update_counters
+from recipes.models import (
+    Amount,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.short_links import bump_version as bump_short_links
+from recipes.shopping_list import (
+    refresh_recipe_shopping_lists,
+    refresh_shopping_lists,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe(instance.id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def counted_object_saved(sender, instance, created, **kwargs):
+    if created:
+        update_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def counted_object_deleted(sender, instance, **kwargs):
+    update_counters(instance, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.short_code:
+        bump_short_links()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    if needs_variants(instance, "image", "image_variants"):
+        schedule_variants(
+            instance,
+            "image",
+            "image_variants",
+            settings.RECIPE_IMAGE_VARIANTS,
+            bump_recipe,
+        )
+
+
+@receiver(post_save, sender=Amount)
+@receiver(post_delete, sender=Amount)
+def amount_changed(sender, instance, **kwargs):
+    bump_recipe(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        bump_recipe(instance.id)
+    else:
+        bump_reference()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reference_changed(sender, **kwargs):
+    # Повторно после коммита, чтобы другие процессы не закэшировали
+    # снимок справочников, прочитанный до фиксации транзакции.
+    bump_reference()
+    transaction.on_commit(bump_reference)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    bump_author(instance.id)
+    if needs_variants(instance, "avatar", "avatar_variants"):
+        schedule_variants(
+            instance,
+            "avatar",
+            "avatar_variants",
+            settings.AVATAR_VARIANTS,
+            bump_author,
+        )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def user_state_changed(sender, instance, **kwargs):
+    bump_user(instance.user_id)
+
+
+def deleted_with(origin, model, pk):
+    """Удаляется ли объект ``model`` с ``pk`` тем же вызовом delete()."""
+    if isinstance(origin, QuerySet):
+        return (
+            issubclass(origin.model, model)
+            and origin.filter(pk=pk).exists()
+        )
+    return isinstance(origin, model) and origin.pk == pk
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(sender, instance, created, **kwargs):
+    if created:
+        refresh_shopping_lists(
+            [instance.user_id],
+            Amount.objects.filter(recipe_id=instance.recipe_id).values(
+                "ingredient_id"
+            ),
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleting(sender, instance, origin=None, **kwargs):
+    # При каскадном удалении рецепта его Amount могут быть удалены
+    # раньше корзины, поэтому ингредиенты запоминаются заранее.
+    if deleted_with(origin, User, instance.user_id):
+        return
+    instance.shopping_list_ingredients = list(
+        Amount.objects.filter(recipe_id=instance.recipe_id).values_list(
+            "ingredient_id", flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    ingredient_ids = getattr(instance, "shopping_list_ingredients", None)
+    if ingredient_ids:
+        refresh_shopping_lists([instance.user_id], ingredient_ids)
+
+
+@receiver(post_save, sender=Amount)
+def amount_saved(sender, instance, created, **kwargs):
+    refresh_recipe_shopping_lists(
+        instance.recipe_id, [instance.ingredient_id] if created else None
+    )
+
+
+@receiver(post_delete, sender=Amount)
+def amount_deleted(sender, instance, origin=None, **kwargs):
+    # При удалении рецепта, ингредиента или пользователя списки
+    # пересчитываются по удалению корзин или каскадом.
+    if isinstance(origin, QuerySet):
+        origin = origin.model
+    else:
+        origin = type(origin)
+    if issubclass(origin, Amount):
+        refresh_recipe_shopping_lists(
+            instance.recipe_id, [instance.ingredient_id]
+        )
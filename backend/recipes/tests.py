@@ -1,11 +1,53 @@
-from django.test import TestCase
+import base64
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from PIL import Image
 from django.urls import reverse
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from recipes.models import Ingredient, Tag, Recipe
-from recipes.constants import RECIPE_COOKING_TIME, RECIPE_INGREDIENT_AMOUNT
-from users.models import CustomUser
+from foodgram.async_views import AsyncReadView
+from foodgram import log
+from foodgram.db import pool
+from recipes.models import (
+    Amount,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.cache import RECIPES_VERSION_KEY, get_stats, get_versions
+from recipes.shopping_list import aggregate_shopping_list, get_shopping_list
+from recipes.short_links import resolver
+from recipes import shopping_list, short_links
+from recipes.constants import (
+    RECIPE_COOKING_TIME,
+    RECIPE_INGREDIENT_AMOUNT,
+    SHORT_CODE_LENGTH,
+)
+from users.models import CustomUser, Subscription
 
 
 class RecipeAPITestCase(TestCase):
@@ -39,3 +81,1205 @@ class RecipeAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Recipe.objects.count(), 1)
         self.assertEqual(Recipe.objects.get().name, "Test Recipe")
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RecipeListAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+        self.author = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author,
+                name=f"Recipe {index}",
+                image="recipes/test.png",
+                text="Test description",
+                cooking_time=RECIPE_COOKING_TIME,
+            )
+            for index in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_flags(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+        response = self.client.get(reverse("recipes-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        flags = {
+            recipe["id"]: (
+                recipe["is_favorited"],
+                recipe["is_in_shopping_cart"],
+            )
+            for recipe in response.data["results"]
+        }
+        self.assertEqual(flags[self.recipes[0].id], (True, False))
+        self.assertEqual(flags[self.recipes[1].id], (False, True))
+        self.assertEqual(flags[self.recipes[2].id], (False, False))
+
+    def test_list_flags_anonymous(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse("recipes-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for recipe in response.data["results"]:
+            self.assertFalse(recipe["is_favorited"])
+            self.assertFalse(recipe["is_in_shopping_cart"])
+
+    def test_list_query_count(self):
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ingredient {index}", measurement_unit="g")
+            for index in range(10)
+        )
+        tag = Tag.objects.create(
+            name="Dessert", color="#FF0000", slug="dessert"
+        )
+        for recipe in self.recipes:
+            recipe.tags.add(tag)
+            Amount.objects.bulk_create(
+                Amount(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=RECIPE_INGREDIENT_AMOUNT,
+                )
+                for ingredient in ingredients
+            )
+        # count, страница, теги, ингредиенты, подписки
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("recipes-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for recipe in response.data["results"]:
+            self.assertEqual(len(recipe["ingredients"]), 10)
+            self.assertEqual(recipe["tags"][0]["slug"], "dessert")
+
+    def test_download_shopping_cart_formats(self):
+        ingredient = Ingredient.objects.create(
+            name="Sugar", measurement_unit="g"
+        )
+        for recipe in self.recipes[:2]:
+            Amount.objects.create(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=RECIPE_INGREDIENT_AMOUNT,
+            )
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        url = reverse("recipes-download-shopping-cart")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(),
+            f"Sugar (g) - {RECIPE_INGREDIENT_AMOUNT * 2}\n",
+        )
+        response = self.client.get(url, {"format": "csv"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[1], f"Sugar,g,{RECIPE_INGREDIENT_AMOUNT * 2}")
+        response = self.client.get(url, {"format": "pdf"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        chunks = list(response.streaming_content)
+        self.assertTrue(chunks[0].startswith(b"%PDF-"))
+        self.assertTrue(chunks[-1].endswith(b"%%EOF\n"))
+        self.assertIn(b"/Count 1", b"".join(chunks))
+        response = self.client.get(url, {"format": "docx"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_toggle_statuses(self):
+        url = reverse("recipes-favorite", args=[self.recipes[0].id])
+        with self.assertNumQueries(5):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["name"], self.recipes[0].name)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        url = reverse("recipes-favorite", args=[0])
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_shopping_cart(self):
+        ingredient = Ingredient.objects.create(
+            name="Sugar", measurement_unit="g"
+        )
+        for recipe in self.recipes:
+            Amount.objects.create(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=RECIPE_INGREDIENT_AMOUNT,
+            )
+        first, second, third = (recipe.id for recipe in self.recipes)
+        unknown = third + 100
+        ShoppingCart.objects.create(user=self.user, recipe_id=first)
+        url = reverse("recipes-shopping-cart-bulk")
+        response = self.client.post(
+            url,
+            {"ids": [first, second, unknown, third, second]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"id": first, "status": "exists"},
+                {"id": second, "status": "added"},
+                {"id": unknown, "status": "not_found"},
+                {"id": third, "status": "added"},
+            ],
+        )
+        self.assertEqual(
+            list(get_shopping_list(self.user)),
+            list(aggregate_shopping_list(self.user)),
+        )
+        response = self.client.delete(
+            url, {"ids": [first, third, unknown]}, format="json"
+        )
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["removed", "removed", "not_found"],
+        )
+        response = self.client.delete(url, {"ids": [first]}, format="json")
+        self.assertEqual(response.data["results"][0]["status"], "missing")
+        self.assertEqual(
+            list(get_shopping_list(self.user)),
+            list(aggregate_shopping_list(self.user)),
+        )
+        counts = dict(Recipe.objects.values_list("id", "in_carts_count"))
+        self.assertEqual(counts, {first: 0, second: 1, third: 0})
+        response = self.client.post(url, {"ids": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_favorite(self):
+        url = reverse("recipes-favorite-bulk")
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.client.post(url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse("recipes-list"))
+        self.assertTrue(
+            all(recipe["is_favorited"] for recipe in response.data["results"])
+        )
+        self.assertTrue(
+            all(
+                recipe["favorites_count"] == 1
+                for recipe in response.data["results"]
+            )
+        )
+
+    def test_representation_cache(self):
+        recipe = self.recipes[0]
+        url = reverse("recipes-detail", args=[recipe.id])
+        self.client.get(url)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(url)
+        self.assertEqual(get_stats(), {"hits": 1, "misses": 1})
+        self.assertTrue(response.data["is_favorited"])
+        recipe.name = "Renamed"
+        recipe.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["name"], "Renamed")
+        self.assertEqual(get_stats(), {"hits": 1, "misses": 2})
+        self.author.first_name = "Renamed"
+        self.author.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["author"]["first_name"], "Renamed")
+
+    def test_detail_etag(self):
+        recipe = self.recipes[0]
+        url = reverse("recipes-detail", args=[recipe.id])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_versions_agree_between_processes(self):
+        cache.delete(RECIPES_VERSION_KEY)
+        get_many = cache.get_many
+
+        def racing_get_many(keys):
+            # Другой процесс создаёт версию сразу после нашего чтения.
+            found = get_many(keys)
+            cache.add(RECIPES_VERSION_KEY, "other", None)
+            return found
+
+        with mock.patch.object(cache, "get_many", racing_get_many):
+            versions = get_versions([RECIPES_VERSION_KEY])
+        self.assertEqual(versions[RECIPES_VERSION_KEY], "other")
+        self.assertEqual(cache.get(RECIPES_VERSION_KEY), "other")
+
+    def test_cursor_pagination(self):
+        Recipe.objects.filter(id=self.recipes[1].id).update(
+            pub_date=self.recipes[2].pub_date
+        )
+        expected = list(
+            Recipe.objects.order_by("-pub_date", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        response = self.client.get(
+            reverse("recipes-list"), {"cursor": "", "limit": 2}
+        )
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        ids = [recipe["id"] for recipe in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        ids += [recipe["id"] for recipe in response.data["results"]]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(response.data["next"])
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(
+            [recipe["id"] for recipe in response.data["results"]],
+            expected[:2],
+        )
+        response = self.client.get(
+            reverse("recipes-list"), {"cursor": "broken"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filters(self):
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (("lunch", "#00FF00"), ("dinner", "#0000FF"))
+        ]
+        self.recipes[0].tags.set(tags)
+        self.recipes[1].tags.set(tags[:1])
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        url = reverse("recipes-list")
+        response = self.client.get(url, {"tags": ["lunch", "dinner"]})
+        self.assertEqual(response.data["count"], 2)
+        response = self.client.get(url, {"is_favorited": 0})
+        self.assertEqual(
+            {recipe["id"] for recipe in response.data["results"]},
+            {self.recipes[1].id, self.recipes[2].id},
+        )
+        response = self.client.get(url, {"is_favorited": 1})
+        self.assertEqual(response.data["count"], 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class IngredientAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit="г")
+            for name in ("Абрикосы", "абрикосовый джем", "Бананы")
+        )
+
+    def test_search_from_snapshot(self):
+        url = reverse("ingredients-list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"name": "абрикос"})
+        self.assertEqual(
+            [ingredient["name"] for ingredient in response.data],
+            ["абрикосовый джем", "Абрикосы"],
+        )
+        Ingredient.objects.create(
+            name="Абрикосовое пюре", measurement_unit="г"
+        )
+        response = self.client.get(url, {"name": "Абрикосовое"})
+        self.assertEqual(
+            [ingredient["name"] for ingredient in response.data],
+            ["Абрикосовое пюре"],
+        )
+
+    def test_snapshot_expires(self):
+        url = reverse("ingredients-list")
+        self.client.get(url)
+        # Изменение мимо сигналов не повышает версию справочников.
+        Ingredient.objects.filter(name="Бананы").update(name="Бананы сушёные")
+        response = self.client.get(url, {"name": "Бананы"})
+        self.assertEqual(response.data[0]["name"], "Бананы")
+        with override_settings(REFERENCE_SNAPSHOT_TTL=0):
+            response = self.client.get(url, {"name": "Бананы"})
+        self.assertEqual(response.data[0]["name"], "Бананы сушёные")
+
+    def test_tags_etag(self):
+        url = reverse("tags-list")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Tag.objects.create(name="Dessert", color="#FF0000", slug="dessert")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+
+class LoadIngredientsTestCase(TestCase):
+    def test_reload_is_idempotent(self):
+        for name in ("ingredients.csv", "ingredients.json"):
+            path = os.path.join(settings.BASE_DIR, "data", name)
+            call_command("load_ingredients", path, stdout=StringIO())
+        self.assertEqual(Ingredient.objects.count(), 2186)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    IMAGE_VARIANT_WORKERS=0,
+    MEDIA_ROOT=tempfile.mkdtemp(),
+)
+class RecipeImageVariantsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_variants_built_after_commit(self):
+        buffer = BytesIO()
+        Image.new("RGB", (2000, 1000)).save(buffer, "PNG")
+        image = base64.b64encode(buffer.getvalue()).decode()
+        ingredient = Ingredient.objects.create(
+            name="Sugar", measurement_unit="g"
+        )
+        tag = Tag.objects.create(
+            name="Dessert", color="#FF0000", slug="dessert"
+        )
+        data = {
+            "name": "Test Recipe",
+            "text": "Test description",
+            "cooking_time": RECIPE_COOKING_TIME,
+            "ingredients": [
+                {"id": ingredient.id, "amount": RECIPE_INGREDIENT_AMOUNT}
+            ],
+            "tags": [tag.id],
+            "image": f"data:image/png;base64,{image}",
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("recipes-list"), data, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.data["image_variants"]["card"], response.data["image"]
+        )
+        recipe = Recipe.objects.get()
+        path = recipe.image.storage.path(recipe.image_variants["card"])
+        with Image.open(path) as card:
+            self.assertEqual(card.format, "WEBP")
+            self.assertEqual(card.size, (480, 240))
+        response = self.client.get(
+            reverse("recipes-detail", args=[recipe.id])
+        )
+        self.assertTrue(
+            response.data["image_variants"]["card"].endswith(".webp")
+        )
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    IMAGE_VARIANT_WORKERS=0,
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    MAX_IMAGE_DIMENSION=1000,
+)
+class RecipeImageUploadTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=self.author)
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Test Recipe",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=RECIPE_COOKING_TIME,
+        )
+        self.url = reverse("recipes-image", args=[self.recipe.id])
+
+    def make_file(self, size, name="image.png"):
+        buffer = BytesIO()
+        Image.new("RGB", size).save(buffer, "PNG")
+        buffer.name = name
+        buffer.seek(0)
+        return buffer
+
+    def test_multipart_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                self.url,
+                {"image": self.make_file((800, 400))},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, "recipes/test.png")
+        self.assertEqual(
+            self.recipe.image_variants["source"], self.recipe.image.name
+        )
+
+    def test_upload_validation(self):
+        response = self.client.put(
+            self.url,
+            {"image": self.make_file((1200, 100))},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        not_image = BytesIO(b"not an image")
+        not_image.name = "image.png"
+        response = self.client.put(
+            self.url, {"image": not_image}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_requires_author(self):
+        other = CustomUser.objects.create_user(
+            email="other@example.com",
+            username="other",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.put(
+            self.url,
+            {"image": self.make_file((100, 100))},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_identical_uploads_deduplicated(self):
+        other = Recipe.objects.create(
+            author=self.author,
+            name="Copy",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=RECIPE_COOKING_TIME,
+        )
+        for recipe in (self.recipe, other):
+            response = self.client.put(
+                reverse("recipes-image", args=[recipe.id]),
+                {"image": self.make_file((300, 200))},
+                format="multipart",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, other.image.name)
+        directory = os.path.dirname(self.recipe.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CountersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+        self.author = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Test Recipe",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=RECIPE_COOKING_TIME,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_counters_follow_changes(self):
+        url = reverse("recipes-detail", args=[self.recipe.id])
+        self.client.get(url)
+        self.client.post(reverse("recipes-favorite", args=[self.recipe.id]))
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        response = self.client.get(url)
+        self.assertEqual(response.data["favorites_count"], 1)
+        self.assertEqual(response.data["in_carts_count"], 1)
+        self.assertEqual(response.data["author"]["recipes_count"], 1)
+        self.assertEqual(response.data["author"]["subscribers_count"], 1)
+        self.client.delete(
+            reverse("recipes-favorite", args=[self.recipe.id])
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+        self.assertEqual(self.author.subscribers_count, 1)
+
+    def test_counters_change_etag(self):
+        other = CustomUser.objects.create_user(
+            email="other@example.com",
+            username="other",
+            password="testpassword",
+        )
+        detail = reverse("recipes-detail", args=[self.recipe.id])
+        etags = {
+            url: self.client.get(url)["ETag"]
+            for url in (detail, reverse("recipes-list"))
+        }
+        Favorite.objects.create(user=other, recipe=self.recipe)
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["favorites_count"], 1)
+        etag = self.client.get(detail)["ETag"]
+        Subscription.objects.create(user=other, author=self.author)
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["author"]["subscribers_count"], 1)
+
+    def recipe_data(self, name):
+        tag = Tag.objects.create(name=name, color="#FF0000", slug=name)
+        ingredient = Ingredient.objects.create(name=name, measurement_unit="g")
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, "PNG")
+        image = base64.b64encode(buffer.getvalue()).decode()
+        return {
+            "name": name,
+            "text": "Test description",
+            "cooking_time": RECIPE_COOKING_TIME,
+            "ingredients": [{"id": ingredient.id, "amount": 5}],
+            "tags": [tag.id],
+            "image": f"data:image/png;base64,{image}",
+        }
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+    def test_create_response_counts_new_recipe(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.post(
+            reverse("recipes-list"), self.recipe_data("second"), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["author"]["recipes_count"], 2)
+
+    def test_save_keeps_managed_fields(self):
+        stale = Recipe.objects.get(pk=self.recipe.id)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        stale.name = "Renamed"
+        stale.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, "Renamed")
+        self.assertEqual(self.recipe.favorites_count, 1)
+        author = CustomUser.objects.get(pk=self.author.id)
+        Subscription.objects.create(user=self.user, author=self.author)
+        author.first_name = "Renamed"
+        author.save()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+    def test_edit_after_favorite(self):
+        self.client.post(reverse("recipes-favorite", args=[self.recipe.id]))
+        self.client.force_authenticate(user=self.author)
+        response = self.client.patch(
+            reverse("recipes-detail", args=[self.recipe.id]),
+            self.recipe_data("renamed"),
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["favorites_count"], 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, "renamed")
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_subscribe_response_counts(self):
+        response = self.client.post(
+            reverse("users-subscribe", args=[self.author.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["subscribers_count"], 1)
+
+    def test_recount_repairs_drift(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.update(favorites_count=5, in_carts_count=2)
+        CustomUser.objects.update(recipes_count=0)
+        call_command("recount", stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.in_carts_count, 0)
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_benchmark_seed_is_repeatable(self):
+        for _ in range(2):
+            call_command(
+                "benchmark_recipe_filters",
+                "--seed",
+                "--recipes=20",
+                "--repeat=1",
+                "--no-explain",
+                stdout=StringIO(),
+            )
+        bench = Recipe.objects.filter(author__username__startswith="bench_")
+        self.assertEqual(bench.count(), 20)
+        self.assertEqual(
+            Tag.objects.filter(slug__startswith="bench-").count(), 10
+        )
+        self.assertEqual(
+            sum(
+                CustomUser.objects.filter(
+                    username__startswith="bench_author_"
+                ).values_list("recipes_count", flat=True)
+            ),
+            20,
+        )
+        user = CustomUser.objects.get(username="bench_user")
+        self.assertEqual(
+            sum(bench.values_list("favorites_count", flat=True)),
+            Favorite.objects.filter(user=user).count(),
+        )
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    IMAGE_VARIANT_WORKERS=0,
+    MEDIA_ROOT=tempfile.mkdtemp(),
+)
+class ShoppingListAggregateTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            CustomUser.objects.create_user(
+                email=f"user{index}@example.com",
+                username=f"user{index}",
+                password="testpassword",
+            )
+            for index in range(2)
+        ]
+        self.author = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        self.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit="g")
+            for name in ("Flour", "Salt", "Sugar")
+        ]
+        self.recipes = []
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f"Recipe {index}",
+                image="recipes/test.png",
+                text="Test description",
+                cooking_time=RECIPE_COOKING_TIME,
+            )
+            for offset, ingredient in enumerate(self.ingredients[index:]):
+                Amount.objects.create(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=10 * (index + 1) + offset,
+                )
+            self.recipes.append(recipe)
+        for user in self.users:
+            for recipe in self.recipes[:2]:
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    def assertConsistent(self):
+        for user in self.users:
+            self.assertEqual(
+                list(get_shopping_list(user)),
+                list(aggregate_shopping_list(user)),
+            )
+
+    def test_cart_changes(self):
+        self.assertConsistent()
+        ShoppingCart.objects.create(user=self.users[0], recipe=self.recipes[2])
+        self.assertConsistent()
+        ShoppingCart.objects.filter(
+            user=self.users[1], recipe=self.recipes[0]
+        ).delete()
+        self.assertConsistent()
+
+    def test_amount_changes(self):
+        amount = self.recipes[0].amounts.get(ingredient=self.ingredients[1])
+        amount.amount = 99
+        amount.save()
+        self.assertConsistent()
+        amount.delete()
+        self.assertConsistent()
+        self.recipes[1].amounts.all().delete()
+        self.assertConsistent()
+
+    def test_recipe_update(self):
+        client = APIClient()
+        client.force_authenticate(user=self.author)
+        tag = Tag.objects.create(name="Dessert", color="#FF0000", slug="d")
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, "PNG")
+        image = base64.b64encode(buffer.getvalue()).decode()
+        response = client.patch(
+            reverse("recipes-detail", args=[self.recipes[0].id]),
+            {
+                "ingredients": [
+                    {"id": self.ingredients[2].id, "amount": 7},
+                ],
+                "tags": [tag.id],
+                "image": f"data:image/png;base64,{image}",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertConsistent()
+
+    def test_recipe_update_refreshes_once(self):
+        client = APIClient()
+        client.force_authenticate(user=self.author)
+        tag = Tag.objects.create(name="Dessert", color="#FF0000", slug="d")
+        recipe = self.recipes[0]
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, "PNG")
+        image = base64.b64encode(buffer.getvalue()).decode()
+        with mock.patch(
+            "recipes.shopping_list.refresh_shopping_lists",
+            wraps=shopping_list.refresh_shopping_lists,
+        ) as refresh:
+            response = client.patch(
+                reverse("recipes-detail", args=[recipe.id]),
+                {
+                    "ingredients": [
+                        {"id": self.ingredients[1].id, "amount": 3},
+                    ],
+                    "tags": [tag.id],
+                    "image": f"data:image/png;base64,{image}",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(refresh.call_count, 1)
+        self.assertConsistent()
+
+    def test_cascade_deletes(self):
+        self.recipes[0].delete()
+        self.assertConsistent()
+        self.ingredients[1].delete()
+        self.assertConsistent()
+        self.users[1].delete()
+        self.users.pop()
+        self.author.delete()
+        self.assertConsistent()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_rebuild_command(self):
+        ShoppingListItem.objects.filter(user=self.users[0]).delete()
+        ShoppingListItem.objects.filter(user=self.users[1]).update(total=1)
+        call_command("rebuild_shopping_lists", stdout=StringIO())
+        self.assertConsistent()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ShortLinkTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        resolver.cache.clear()
+        self.client = APIClient()
+        self.author = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Test Recipe",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=RECIPE_COOKING_TIME,
+        )
+
+    def test_short_link_redirect(self):
+        url = reverse("recipes-get-link", args=[self.recipe.id])
+        stale = Recipe.objects.get(pk=self.recipe.id)
+        short_link = self.client.get(url).data["short-link"]
+        # Сохранение экземпляра, загруженного до создания кода, не
+        # стирает код.
+        stale.name = "Renamed"
+        stale.save()
+        self.assertEqual(self.client.get(url).data["short-link"], short_link)
+        self.recipe.refresh_from_db()
+        code = self.recipe.short_code
+        self.assertEqual(len(code), SHORT_CODE_LENGTH)
+        self.assertTrue(short_link.endswith(f"/s/{code}/"))
+        redirect_url = reverse("short-link", args=[code])
+        response = self.client.get(redirect_url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response["Location"], f"/recipes/{self.recipe.id}")
+        with self.assertNumQueries(0):
+            self.client.get(redirect_url)
+        resolver.flush()
+        stats = short_links.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        # Удаление не трогает LRU процессов, а повышает версию ссылок
+        # в общем кэше.
+        self.recipe.delete()
+        self.assertIsNotNone(resolver.cache.get(code))
+        response = self.client.get(redirect_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnlessDBFeature("has_select_for_update")
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConcurrentToggleTestCase(TransactionTestCase):
+    THREADS = 4
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name="Test Recipe",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=RECIPE_COOKING_TIME,
+        )
+
+    def send_in_parallel(self, method, url, data=None):
+        barrier = threading.Barrier(self.THREADS)
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            barrier.wait()
+            try:
+                return getattr(client, method)(url, data, format="json")
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.THREADS) as executor:
+            futures = [executor.submit(send) for _ in range(self.THREADS)]
+            return [future.result() for future in futures]
+
+    def request_in_parallel(self, method, url):
+        return sorted(
+            response.status_code
+            for response in self.send_in_parallel(method, url)
+        )
+
+    def test_parallel_toggles(self):
+        for name, model in (
+            ("recipes-favorite", Favorite),
+            ("recipes-shopping-cart", ShoppingCart),
+        ):
+            url = reverse(name, args=[self.recipe.id])
+            statuses = self.request_in_parallel("post", url)
+            self.assertEqual(
+                statuses,
+                [status.HTTP_201_CREATED]
+                + [status.HTTP_400_BAD_REQUEST] * (self.THREADS - 1),
+            )
+            self.assertEqual(model.objects.count(), 1)
+            statuses = self.request_in_parallel("delete", url)
+            self.assertEqual(
+                statuses,
+                [status.HTTP_204_NO_CONTENT]
+                + [status.HTTP_400_BAD_REQUEST] * (self.THREADS - 1),
+            )
+            self.assertFalse(model.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.recipe.in_carts_count, 0)
+
+    def test_parallel_bulk(self):
+        url = reverse("recipes-shopping-cart-bulk")
+        data = {"ids": [self.recipe.id]}
+        for method, expected in (("post", "added"), ("delete", "removed")):
+            statuses = sorted(
+                response.data["results"][0]["status"]
+                for response in self.send_in_parallel(method, url, data)
+            )
+            self.assertEqual(statuses.count(expected), 1)
+            self.recipe.refresh_from_db()
+            self.assertEqual(
+                self.recipe.in_carts_count, ShoppingCart.objects.count()
+            )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsyncReadViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+        self.token = Token.objects.create(user=self.user).key
+        author = CustomUser.objects.create_user(
+            email="author@example.com",
+            username="author",
+            password="testpassword",
+        )
+        Subscription.objects.create(user=self.user, author=author)
+        self.tag = Tag.objects.create(
+            name="Завтрак", color="#FF0000", slug="b"
+        )
+        self.ingredient = Ingredient.objects.create(
+            name="Абрикосы", measurement_unit="г"
+        )
+        self.recipe = Recipe.objects.create(
+            author=author,
+            name="Test Recipe",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=RECIPE_COOKING_TIME,
+        )
+        self.recipe.tags.add(self.tag)
+        Amount.objects.create(
+            recipe=self.recipe,
+            ingredient=self.ingredient,
+            amount=RECIPE_INGREDIENT_AMOUNT,
+        )
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+
+    async def get_async(self, path, **headers):
+        with override_settings(ROOT_URLCONF="foodgram.asgi_urls"):
+            response = await self.async_client.get(path, headers=headers)
+            self.assertTrue(
+                issubclass(
+                    response.resolver_match.func.view_class, AsyncReadView
+                )
+            )
+        return response
+
+    async def test_matches_sync_views(self):
+        paths = (
+            "/api/recipes/",
+            "/api/recipes/?is_favorited=1&tags=b",
+            f"/api/recipes/{self.recipe.id}/",
+            "/api/ingredients/?name=абр",
+            f"/api/ingredients/{self.ingredient.id}/",
+            "/api/tags/",
+            f"/api/tags/{self.tag.id}/",
+            "/api/users/subscriptions/",
+        )
+        for path in paths:
+            for headers in ({}, {"authorization": f"Token {self.token}"}):
+                with self.subTest(path=path, auth=bool(headers)):
+                    response = await self.get_async(path, **headers)
+                    expected = await self.async_client.get(
+                        path, headers=headers
+                    )
+                    self.assertEqual(
+                        response.status_code, expected.status_code
+                    )
+                    self.assertEqual(response.json(), expected.json())
+
+    async def test_etag_and_fallback(self):
+        headers = {"authorization": f"Token {self.token}"}
+        response = await self.get_async("/api/tags/", **headers)
+        response = await self.get_async(
+            "/api/tags/", if_none_match=response["ETag"], **headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = await self.get_async(
+            f"/api/recipes/{self.recipe.id}/", authorization="Token invalid"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.get_async("/api/recipes/0/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        with override_settings(ROOT_URLCONF="foodgram.asgi_urls"):
+            response = await self.async_client.delete(
+                f"/api/recipes/{self.recipe.id}/", headers=headers
+            )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        pool.stats.flush()
+        pool.reset_stats()
+
+    def test_reuse_and_saturation(self):
+        connection_pool = pool.ConnectionPool(max_size=1, timeout=0.01)
+        first = connection_pool.acquire(FakeConnection)
+        with self.assertRaises(pool.PoolTimeout):
+            connection_pool.acquire(FakeConnection)
+        connection_pool.release(first)
+        self.assertIs(connection_pool.acquire(FakeConnection), first)
+        first.close()
+        connection_pool.release(first)
+        second = connection_pool.acquire(FakeConnection)
+        self.assertIsNot(second, first)
+        connection_pool.release(second)
+
+        def check(connection):
+            raise OSError
+
+        third = connection_pool.acquire(FakeConnection, check)
+        self.assertIsNot(third, second)
+        pool.stats.flush()
+        stats = pool.get_stats()
+        self.assertEqual(stats["acquires"], 4)
+        self.assertEqual(stats["connects"], 3)
+        self.assertEqual((stats["waits"], stats["timeouts"]), (1, 1))
+        self.assertEqual(stats["discards"], 2)
+
+
+@skipUnless(connection.vendor == "postgresql", "Нужен PostgreSQL")
+class PooledPostgresTestCase(TransactionTestCase):
+    """Пул бэкенда foodgram.db.postgresql на настоящем PostgreSQL."""
+
+    def make_wrapper(self, **options):
+        from foodgram.db.postgresql.base import DatabaseWrapper, pools
+
+        alias = f"pool_test_{self._testMethodName}"
+        settings_dict = {
+            **connection.settings_dict,
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": True,
+            "POOL": {"MAX_SIZE": 1, "TIMEOUT": 5, **options},
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias)
+        self.addCleanup(lambda: pools.pop(alias).close_all())
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    @staticmethod
+    def backend_pid(wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            return cursor.fetchone()[0]
+
+    def test_rollback_on_release(self):
+        wrapper = self.make_wrapper()
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = 1234")
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        self.assertEqual(self.backend_pid(wrapper), pid)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertNotEqual(cursor.fetchone()[0], "1234ms")
+
+    def test_health_check_replaces_dead_connection(self):
+        wrapper = self.make_wrapper()
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+        self.assertNotEqual(self.backend_pid(wrapper), pid)
+
+    def test_max_age_expiry(self):
+        wrapper = self.make_wrapper(MAX_AGE=0.05)
+        pid = self.backend_pid(wrapper)
+        time.sleep(0.1)
+        wrapper.close()
+        self.assertNotEqual(self.backend_pid(wrapper), pid)
+
+    def test_thread_handoff(self):
+        from foodgram.db.postgresql.base import DatabaseWrapper
+
+        wrapper = self.make_wrapper()
+        pid = self.backend_pid(wrapper)
+        pids = []
+
+        def borrow():
+            other = DatabaseWrapper(wrapper.settings_dict, wrapper.alias)
+            # Единственное соединение пула занято основным потоком.
+            pids.append(self.backend_pid(other))
+            other.close()
+
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        time.sleep(0.1)
+        self.assertEqual(pids, [])
+        wrapper.close()
+        thread.join(5)
+        self.assertEqual(pids, [pid])
+
+    def test_persistent_connection_counts_acquires(self):
+        from foodgram.db.postgresql.base import DatabaseWrapper
+
+        pool.stats.flush()
+        pool.reset_stats()
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, "CONN_MAX_AGE": None},
+            f"persistent_{self._testMethodName}",
+        )
+        self.addCleanup(wrapper.close)
+        for _ in range(3):
+            # Так request_started сбрасывает флаг перед каждым запросом.
+            wrapper.acquired = False
+            self.backend_pid(wrapper)
+            self.backend_pid(wrapper)
+        pool.stats.flush()
+        stats = pool.get_stats()
+        self.assertEqual((stats["acquires"], stats["connects"]), (3, 1))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StructuredLoggingTestCase(TestCase):
+    def test_request_id_header(self):
+        client = APIClient()
+        with self.assertLogs("foodgram.request", "INFO") as logs:
+            response = client.get(reverse("tags-list"))
+        self.assertEqual(len(response[log.REQUEST_ID_HEADER]), 32)
+        self.assertEqual(logs.records[0].status, status.HTTP_200_OK)
+        self.assertEqual(logs.records[0].path, reverse("tags-list"))
+        response = client.get(
+            reverse("tags-list"), HTTP_X_REQUEST_ID="abc123"
+        )
+        self.assertEqual(response[log.REQUEST_ID_HEADER], "abc123")
+
+    def test_queued_json_record(self):
+        records = queue.Queue(1)
+        handler = log.RequestQueueHandler(records)
+        logger = logging.getLogger("foodgram.tests")
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(logger.setLevel, logging.NOTSET)
+        self.addCleanup(setattr, logger, "propagate", True)
+        token = log.request_id.set("req-1")
+        try:
+            logger.warning("%s готов", "рецепт", extra={"duration": 0.5})
+            logger.warning("не влезет в очередь")
+        finally:
+            log.request_id.reset(token)
+        self.assertEqual(handler.dropped, 1)
+        data = json.loads(log.JsonFormatter().format(records.get_nowait()))
+        self.assertEqual(data["message"], "рецепт готов")
+        self.assertEqual(data["request_id"], "req-1")
+        self.assertEqual(data["duration_ms"], 500)
+
+    def test_sql_sampling(self):
+        sampling = log.SamplingFilter(rate=0, slow_ms=100)
+        record = logging.makeLogRecord({"duration": 0.01})
+        self.assertFalse(sampling.filter(record))
+        record.duration = 0.2
+        self.assertTrue(sampling.filter(record))
@@ -1,9 +1,17 @@
-from django.http import HttpResponse
-from django.db.models import Sum
+from django.http import (
+    Http404,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import viewsets, permissions, status
+from django.urls import reverse
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import exception_handler
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
@@ -17,30 +25,187 @@ from recipes.models import (
     Amount,
 )
 from recipes.serializers import (
+    AUTHOR_COUNTER_FIELDS,
+    RecipeIdsSerializer,
+    RecipeImageSerializer,
     RecipeSerializer,
     IngredientSerializer,
     TagSerializer,
 )
 from recipes.short_serializers import RecipeShortSerializer
 from recipes.permissions import IsAuthorOrReadOnly
+from recipes.cache import (
+    RECIPES_VERSION_KEY,
+    REFERENCE_VERSION_KEY,
+    author_counters_key,
+    author_version_key,
+    bump_user,
+    get_versions,
+    recipe_counters_key,
+    recipe_version_key,
+    user_version_key,
+)
 from recipes.filters import IngredientFilter, RecipeFilter
-from foodgram.pagination import CustomPagination
+from recipes.reference import get_reference_snapshot
+from recipes.counters import update_counters_bulk
+from recipes.shopping_list import (
+    RENDERERS,
+    get_shopping_list,
+    refresh_shopping_lists,
+)
+from recipes.short_links import get_or_create_code, resolver
+from foodgram.conditional import ConditionalGetMixin
+from foodgram.uploads import spool_uploads_to_disk
+from foodgram.pagination import RecipePagination
+
+
+def get_from_snapshot(objects, pk):
+    try:
+        return objects[int(pk)]
+    except (KeyError, TypeError, ValueError):
+        raise Http404
+
+
+def get_user_etag_parts(user):
+    if not user.is_authenticated:
+        return [0]
+    key = user_version_key(user.id)
+    return [user.id, get_versions([key])[key]]
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+def get_recipe_queryset(user):
+    """Рецепты с данными для RecipeSerializer и флагами пользователя."""
     queryset = (
         Recipe.objects.all()
         .select_related("author")
-        .prefetch_related("tags", "ingredients")
+        .prefetch_related(
+            "tags",
+            Prefetch(
+                "amounts", queryset=Amount.objects.select_related("ingredient")
+            ),
+        )
+    )
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_favorited=Value(False),
+            is_in_shopping_cart=Value(False),
+        )
+    return queryset.annotate(
+        is_favorited=Exists(
+            Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+        ),
+        is_in_shopping_cart=Exists(
+            ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+        ),
+    )
+
+
+def get_recipe_list_etag_parts(request):
+    versions = get_versions([RECIPES_VERSION_KEY, REFERENCE_VERSION_KEY])
+    return get_user_etag_parts(request.user) + [
+        versions[RECIPES_VERSION_KEY],
+        versions[REFERENCE_VERSION_KEY],
+        request.query_params.urlencode(),
+    ]
+
+
+def get_recipe_etag_parts(request, recipe_id, author_id):
+    keys = [
+        recipe_version_key(recipe_id),
+        author_version_key(author_id),
+        recipe_counters_key(recipe_id),
+        author_counters_key(author_id),
+        REFERENCE_VERSION_KEY,
+    ]
+    versions = get_versions(keys)
+    return get_user_etag_parts(request.user) + [
+        versions[key] for key in keys
+    ]
+
+
+def relation_columns(model):
+    return (
+        connection.ops.quote_name(model._meta.db_table),
+        connection.ops.quote_name(model._meta.get_field("user").column),
+        connection.ops.quote_name(model._meta.get_field("recipe").column),
     )
+
+
+def insert_relations(model, user_id, recipe_ids):
+    """INSERT … ON CONFLICT DO NOTHING, возвращает вставленные id.
+
+    Строки, уже добавленные параллельным запросом, в результат не
+    попадают, поэтому счётчики и статусы считаются по факту вставки.
+    """
+    table, user_column, recipe_column = relation_columns(model)
+    values = ", ".join(["(%s, %s)"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({user_column}, {recipe_column}) "
+            f"VALUES {values} ON CONFLICT DO NOTHING "
+            f"RETURNING {recipe_column}",
+            [value for pk in recipe_ids for value in (user_id, pk)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_relations(model, user_id, recipe_ids):
+    """DELETE … RETURNING, возвращает id удалённых строк.
+
+    Сигналы не отправляются: вызывающий код сам обновляет счётчики и
+    списки покупок одним запросом на все рецепты.
+    """
+    table, user_column, recipe_column = relation_columns(model)
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {user_column} = %s "
+            f"AND {recipe_column} IN ({placeholders}) "
+            f"RETURNING {recipe_column}",
+            [user_id, *recipe_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def parse_recipe_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     permission_classes = [IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly]
+    vary_headers = ("Authorization",)
+
+    def get_etag_parts(self, request, *args, **kwargs):
+        if self.action == "list":
+            return get_recipe_list_etag_parts(request)
+        recipe_id = parse_recipe_id(kwargs.get(self.lookup_field))
+        if recipe_id is None:
+            return None
+        author_id = (
+            Recipe.objects.filter(pk=recipe_id)
+            .values_list("author_id", flat=True)
+            .first()
+        )
+        if author_id is None:
+            return None
+        return get_recipe_etag_parts(request, recipe_id, author_id)
+
+    def get_queryset(self):
+        return get_recipe_queryset(self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        # Сигнал увеличил recipes_count через F(), а в ответе автор
+        # сериализуется из request.user.
+        self.request.user.refresh_from_db(fields=AUTHOR_COUNTER_FIELDS)
 
     @action(
         detail=True,
@@ -48,30 +213,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def favorite(self, request, pk=None):
-        recipe = self.get_object()
-        user = request.user
-        if user.favorites.filter(recipe=recipe).exists():
-            return Response(
-                {"errors": "Рецепт уже в избранном"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        Favorite.objects.create(user=user, recipe=recipe)
-        serializer = RecipeShortSerializer(
-            recipe, context={"request": request}
-        )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_relation(Favorite, pk, "Рецепт уже в избранном")
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk=None):
-        recipe = self.get_object()
-        user = request.user
-        favorite = user.favorites.filter(recipe=recipe)
-        if favorite.exists():
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {"errors": "Рецепт отсутствует в избранном"},
-            status=status.HTTP_400_BAD_REQUEST,
+        return self.remove_relation(
+            Favorite, pk, "Рецепт отсутствует в избранном"
         )
 
     @action(
@@ -80,31 +227,183 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def shopping_cart(self, request, pk=None):
-        recipe = self.get_object()
-        user = request.user
-        if user.shopping_cart.filter(recipe=recipe).exists():
+        return self.add_relation(
+            ShoppingCart, pk, "Рецепт уже в корзине покупок"
+        )
+
+    @shopping_cart.mapping.delete
+    def delete_shopping_cart(self, request, pk=None):
+        return self.remove_relation(
+            ShoppingCart, pk, "Рецепт отсутствует в корзине покупок"
+        )
+
+    def add_relation(self, model, pk, error):
+        """Добавляет рецепт в избранное или корзину одним INSERT.
+
+        Повтор, в том числе параллельный, упирается в unique_together
+        и возвращает 400.
+        """
+        recipe = get_object_or_404(
+            Recipe.objects.only(
+                "id", "name", "image", "image_variants", "cooking_time"
+            ),
+            pk=pk,
+        )
+        try:
+            with transaction.atomic():
+                model.objects.create(user=self.request.user, recipe=recipe)
+        except IntegrityError:
             return Response(
-                {"errors": "Рецепт уже в корзине покупок"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"errors": error}, status=status.HTTP_400_BAD_REQUEST
             )
-        ShoppingCart.objects.create(user=user, recipe=recipe)
         serializer = RecipeShortSerializer(
-            recipe, context={"request": request}
+            recipe, context={"request": self.request}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    @shopping_cart.mapping.delete
-    def delete_shopping_cart(self, request, pk=None):
-        recipe = self.get_object()
-        user = request.user
-        cart_item = user.shopping_cart.filter(recipe=recipe)
-        if cart_item.exists():
-            cart_item.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    def remove_relation(self, model, pk, error):
+        """Удаляет рецепт из избранного или корзины.
+
+        Строка блокируется до удаления, поэтому при параллельных
+        запросах сигналы счётчиков срабатывают ровно один раз, а
+        остальные запросы получают 400.
+        """
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        with transaction.atomic():
+            relation = (
+                model.objects.select_for_update()
+                .filter(user=self.request.user, recipe_id=recipe_id)
+                .first()
+            )
+            if relation is not None:
+                relation.delete()
+                return Response(status=status.HTTP_204_NO_CONTENT)
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            raise Http404
+        return Response({"errors": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path="favorite/bulk",
+    )
+    def favorite_bulk(self, request):
+        return self.add_relations(Favorite)
+
+    @favorite_bulk.mapping.delete
+    def delete_favorite_bulk(self, request):
+        return self.remove_relations(Favorite)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path="shopping_cart/bulk",
+    )
+    def shopping_cart_bulk(self, request):
+        return self.add_relations(ShoppingCart)
+
+    @shopping_cart_bulk.mapping.delete
+    def delete_shopping_cart_bulk(self, request):
+        return self.remove_relations(ShoppingCart)
+
+    def get_bulk_ids(self):
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data["ids"]))
+
+    def add_relations(self, model):
+        """Добавляет несколько рецептов одним INSERT.
+
+        Возвращает итог по каждому id: added, exists или not_found.
+        """
+        ids = self.get_bulk_ids()
+        user = self.request.user
+        with transaction.atomic():
+            found = set(
+                Recipe.objects.filter(id__in=ids).values_list("id", flat=True)
+            )
+            added = []
+            if found:
+                added = insert_relations(
+                    model, user.id, [pk for pk in ids if pk in found]
+                )
+            self.relations_changed(model, added, 1)
+        results = dict.fromkeys(ids, "not_found")
+        results.update(dict.fromkeys(found, "exists"))
+        results.update(dict.fromkeys(added, "added"))
+        return self.bulk_response(results)
+
+    def remove_relations(self, model):
+        """Удаляет несколько рецептов одним DELETE.
+
+        Возвращает итог по каждому id: removed, missing или not_found.
+        """
+        ids = self.get_bulk_ids()
+        user = self.request.user
+        with transaction.atomic():
+            removed = delete_relations(model, user.id, ids)
+            self.relations_changed(model, removed, -1)
+        results = dict.fromkeys(ids, "not_found")
+        missing = set(ids).difference(removed)
+        if missing:
+            results.update(
+                dict.fromkeys(
+                    Recipe.objects.filter(id__in=missing).values_list(
+                        "id", flat=True
+                    ),
+                    "missing",
+                )
+            )
+        results.update(dict.fromkeys(removed, "removed"))
+        return self.bulk_response(results)
+
+    def relations_changed(self, model, recipe_ids, delta):
+        if not recipe_ids:
+            return
+        user = self.request.user
+        update_counters_bulk(model, recipe_ids, delta)
+        bump_user(user.id)
+        if model is ShoppingCart:
+            refresh_shopping_lists(
+                [user.id],
+                Amount.objects.filter(recipe_id__in=recipe_ids).values(
+                    "ingredient_id"
+                ),
+            )
+
+    def bulk_response(self, results):
         return Response(
-            {"errors": "Рецепт отсутствует в корзине покупок"},
-            status=status.HTTP_400_BAD_REQUEST,
+            {
+                "results": [
+                    {"id": pk, "status": result}
+                    for pk, result in results.items()
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(
+        detail=True,
+        methods=["put"],
+        parser_classes=[MultiPartParser],
+        permission_classes=[permissions.IsAuthenticated, IsAuthorOrReadOnly],
+    )
+    def image(self, request, pk=None):
+        """Загрузка изображения рецепта файлом multipart/form-data."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        self.check_object_permissions(request, recipe)
+        spool_uploads_to_disk(request)
+        serializer = RecipeImageSerializer(
+            recipe, data=request.data, context={"request": request}
         )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
         detail=False,
@@ -113,49 +412,85 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         user = request.user
-        shopping_cart_items = ShoppingCart.objects.filter(
-            user=user
-        ).values_list("recipe", flat=True)
-        if not shopping_cart_items.exists():
+        file_format = request.query_params.get("format", "txt")
+        renderer_class = RENDERERS.get(file_format)
+        if renderer_class is None:
+            return Response(
+                {
+                    "error": "Доступные форматы: "
+                    + ", ".join(sorted(RENDERERS))
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not ShoppingCart.objects.filter(user=user).exists():
             return Response(
                 {"error": "Ваша корзина покупок пуста."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        ingredients = (
-            Amount.objects.filter(recipe__in=shopping_cart_items)
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
+        renderer = renderer_class()
+        response = StreamingHttpResponse(
+            renderer.render(get_shopping_list(user)),
+            content_type=renderer.content_type,
         )
-
-        shopping_list = ""
-        for ingredient in ingredients:
-            name = ingredient["ingredient__name"]
-            measurement_unit = ingredient["ingredient__measurement_unit"]
-            amount = ingredient["total_amount"]
-            shopping_list += f"{name} ({measurement_unit}) - {amount}\n"
-
-        response = HttpResponse(shopping_list, content_type="text/plain")
         response["Content-Disposition"] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.extension}"'
         )
         return response
 
+    def perform_content_negotiation(self, request, force=False):
+        # Параметр format выбирает формат файла списка покупок,
+        # а не рендерер DRF.
+        if self.action == "download_shopping_cart":
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     def custom_exception_handler(exc, context):
         response = exception_handler(exc, context)
         return response
 
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_link(self, request, pk=None):
-        recipe = self.get_object()
+        recipe = get_object_or_404(
+            Recipe.objects.only("id", "short_code"), pk=pk
+        )
         short_link = self.generate_short_link(recipe)
         return Response({"short-link": short_link}, status=status.HTTP_200_OK)
 
     def generate_short_link(self, recipe):
-        return f"https://short.link/{recipe.id}"
+        return self.request.build_absolute_uri(
+            reverse("short-link", args=[get_or_create_code(recipe)])
+        )
+
+
+def short_link_redirect(request, code):
+    """Перенаправляет с короткой ссылки на страницу рецепта."""
+    recipe_id = resolver.resolve(code)
+    if recipe_id is None:
+        raise Http404
+    # Не 301: браузер закэшировал бы переход и после удаления рецепта.
+    return HttpResponseRedirect(f"/recipes/{recipe_id}")
+
 
+def get_reference_etag_parts(basename, action, pk, request):
+    version = get_versions([REFERENCE_VERSION_KEY])[REFERENCE_VERSION_KEY]
+    return [
+        basename,
+        action,
+        version,
+        pk,
+        request.query_params.urlencode(),
+    ]
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+def search_ingredients(snapshot, request):
+    name = request.query_params.get(IngredientFilter.search_param)
+    if name:
+        return snapshot.search_ingredients(name)
+    return snapshot.ingredients
+
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [permissions.AllowAny]
@@ -164,9 +499,43 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (IngredientFilter,)
     search_fields = ["^name"]
 
+    def get_etag_parts(self, request, *args, **kwargs):
+        return get_reference_etag_parts(
+            self.basename,
+            self.action,
+            kwargs.get(self.lookup_field, ""),
+            request,
+        )
+
+    def filter_queryset(self, queryset):
+        return search_ingredients(get_reference_snapshot(), self.request)
+
+    def get_object(self):
+        snapshot = get_reference_snapshot()
+        return get_from_snapshot(
+            snapshot.ingredients_by_id, self.kwargs.get(self.lookup_field)
+        )
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = [permissions.AllowAny]
+
+    def get_etag_parts(self, request, *args, **kwargs):
+        return get_reference_etag_parts(
+            self.basename,
+            self.action,
+            kwargs.get(self.lookup_field, ""),
+            request,
+        )
+
+    def filter_queryset(self, queryset):
+        return get_reference_snapshot().tags
+
+    def get_object(self):
+        return get_from_snapshot(
+            get_reference_snapshot().tags_by_id,
+            self.kwargs.get(self.lookup_field),
+        )
@@ -0,0 +1,22 @@
+from foodgram.async_views import AsyncReadView
+from foodgram.pagination import CustomPagination
+from users.serializers import SubscriptionSerializer
+from users.views import get_subscriptions_queryset
+
+
+class SubscriptionListView(AsyncReadView):
+    vary_headers = ("Accept", "Authorization")
+
+    async def aget(self, request):
+        if not request.user.is_authenticated:
+            return await self.delegate(request._request)
+        paginator = CustomPagination()
+        authors = await paginator.apaginate_queryset(
+            get_subscriptions_queryset(request), request
+        )
+        serializer = SubscriptionSerializer(
+            authors, many=True, context={"request": request}
+        )
+        return self.render(
+            paginator.get_paginated_response(serializer.data).data
+        )
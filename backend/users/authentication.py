@@ -0,0 +1,111 @@
+import pickle
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.lru import LRUCache
+
+
+class TokenCache:
+    """Кэш токен → пользователь.
+
+    Записи хранятся в LRU процесса или, при ``TOKEN_CACHE_SHARED``, в
+    общем кэше и помечены поколением пользователя из общего кэша.
+    Выход, удаление токена, деактивация и смена пароля повышают
+    поколение, поэтому запись перестаёт действовать во всех процессах
+    сразу; без изменений она живёт ``TOKEN_CACHE_TTL`` секунд.
+    """
+
+    def __init__(self, max_size, ttl, shared):
+        self.local = LRUCache(max_size, ttl)
+        self.ttl = ttl
+        self.shared = shared
+
+    @staticmethod
+    def cache_key(key):
+        return f"auth:token:{key}"
+
+    @staticmethod
+    def generation_key(user_id):
+        return f"auth:user:{user_id}:generation"
+
+    def generation(self, user_id):
+        key = self.generation_key(user_id)
+        cache.add(key, time.time_ns(), None)
+        return cache.get(key)
+
+    async def ageneration(self, user_id):
+        key = self.generation_key(user_id)
+        await cache.aadd(key, time.time_ns(), None)
+        return await cache.aget(key)
+
+    def get(self, key):
+        if self.shared:
+            item = cache.get(self.cache_key(key))
+        else:
+            item = self.local.get(key)
+        if item is None:
+            return None
+        user_id, generation, data = item
+        if generation != self.generation(user_id):
+            return None
+        # Каждый запрос получает свою копию пользователя.
+        return pickle.loads(data)
+
+    async def aget(self, key):
+        if self.shared:
+            item = await cache.aget(self.cache_key(key))
+        else:
+            item = self.local.get(key)
+        if item is None:
+            return None
+        user_id, generation, data = item
+        if generation != await self.ageneration(user_id):
+            return None
+        return pickle.loads(data)
+
+    def set(self, key, user):
+        item = (user.id, self.generation(user.id), pickle.dumps(user))
+        if self.shared:
+            cache.set(self.cache_key(key), item, self.ttl)
+        else:
+            self.local.set(key, item)
+
+    def invalidate(self, user_id):
+        """Сбрасывает записи всех токенов пользователя во всех процессах."""
+        cache.set(self.generation_key(user_id), time.time_ns(), None)
+
+    def clear(self):
+        self.local.clear()
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE,
+    settings.TOKEN_CACHE_TTL,
+    settings.TOKEN_CACHE_SHARED,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД при попадании в кэш.
+
+    Изменяющие запросы всегда читают пользователя из БД, чтобы не
+    сохранить поверх свежих данных копию из кэша.
+    """
+
+    def authenticate(self, request):
+        self.method = request.method
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if self.method in SAFE_METHODS:
+            user = token_cache.get(key)
+            if user is not None:
+                return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
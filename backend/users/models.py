@@ -1,18 +1,39 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from foodgram.models import ManagedFieldsMixin
 
-class CustomUser(AbstractUser):
+
+class CustomUser(ManagedFieldsMixin, AbstractUser):
     email = models.EmailField(verbose_name="Email адрес", unique=True)
 
     avatar = models.ImageField(
         upload_to="avatars/", verbose_name="Аватар", blank=True, null=True
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Варианты аватара",
+    )
 
     first_name = models.CharField("first name", max_length=150, blank=False)
 
     last_name = models.CharField("last name", max_length=150, blank=False)
 
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Рецептов"
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Подписчиков"
+    )
+
+    managed_fields = (
+        "recipes_count",
+        "subscribers_count",
+        "avatar_variants",
+    )
+
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
     USERNAME_FIELD = "email"
 
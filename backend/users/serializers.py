@@ -1,17 +1,42 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from drf_extra_fields.fields import Base64ImageField
 
+from foodgram.image_variants import ImageVariantsField
+from foodgram.uploads import UploadedImageField
 from users.models import Subscription
+from users.subscriptions import (
+    SubscriptionPrimingListSerializer,
+    get_subscription_cache,
+)
 from recipes.short_serializers import RecipeShortSerializer
 
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get("recipes_limit")
+    if not recipes_limit:
+        return None
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = 0
+    if recipes_limit < 1:
+        raise serializers.ValidationError(
+            {"recipes_limit": "Укажите целое положительное число."}
+        )
+    return recipes_limit
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_variants = ImageVariantsField(
+        "avatar", "avatar_variants", settings.AVATAR_VARIANTS
+    )
     password = serializers.CharField(write_only=True, required=True)
 
     class Meta:
@@ -25,8 +50,12 @@ class UserSerializer(serializers.ModelSerializer):
             "password",
             "is_subscribed",
             "avatar",
+            "avatar_variants",
+            "recipes_count",
+            "subscribers_count",
         )
         extra_kwargs = {"password": {"write_only": True}}
+        list_serializer_class = SubscriptionPrimingListSerializer
 
     def create(self, validated_data):
         password = validated_data.pop("password")
@@ -53,12 +82,12 @@ class UserSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+    def get_author_ids(self, users):
+        return [user.id for user in users]
+
     def get_is_subscribed(self, obj):
         request = self.context["request"]
-        user = request.user
-        if user.is_authenticated:
-            return user.subscriptions.filter(author=obj).exists()
-        return False
+        return get_subscription_cache(request).is_subscribed(obj.id)
 
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
@@ -81,11 +110,11 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
-    recipes = RecipeShortSerializer(many=True, read_only=True)
-    recipes_count = serializers.IntegerField(
-        source="recipes.count", read_only=True
-    )
+    recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField(
+        "avatar", "avatar_variants", settings.AVATAR_VARIANTS
+    )
 
     class Meta:
         model = User
@@ -98,23 +127,24 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             "is_subscribed",
             "recipes",
             "recipes_count",
+            "subscribers_count",
             "avatar",
+            "avatar_variants",
         )
 
     def get_is_subscribed(self, obj):
         return True
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        recipes_limit = self.context["request"].query_params.get(
-            "recipes_limit"
-        )
-        if recipes_limit:
-            recipes_limit = int(recipes_limit)
-            representation["recipes"] = representation["recipes"][
-                :recipes_limit
-            ]
-        return representation
+    def get_recipes(self, obj):
+        recipes = getattr(obj, "limited_recipes", None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context["request"])
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
+        return RecipeShortSerializer(
+            recipes, many=True, context=self.context
+        ).data
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -123,3 +153,14 @@ class AvatarSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("avatar",)
+
+
+class AvatarUploadSerializer(serializers.ModelSerializer):
+    avatar = UploadedImageField()
+    avatar_variants = ImageVariantsField(
+        "avatar", "avatar_variants", settings.AVATAR_VARIANTS
+    )
+
+    class Meta:
+        model = User
+        fields = ("avatar", "avatar_variants")
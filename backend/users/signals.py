@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import token_cache
+
+User = get_user_model()
+
+
+def forget_tokens(user_id):
+    # Повторно после коммита, чтобы параллельный запрос не закэшировал
+    # пользователя, прочитанного до фиксации транзакции.
+    token_cache.invalidate(user_id)
+    transaction.on_commit(lambda: token_cache.invalidate(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    forget_tokens(instance.id)
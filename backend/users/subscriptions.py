@@ -0,0 +1,73 @@
+from rest_framework import serializers
+
+from users.models import Subscription
+
+
+class SubscriptionCache:
+    """Подписки текущего пользователя в рамках одного запроса.
+
+    Хранит множество id авторов, на которых подписан пользователь, и
+    догружает недостающие id одним запросом на пачку авторов.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._checked = set()
+        self._subscribed = set()
+
+    def get_missing(self, author_ids):
+        if not self.user.is_authenticated:
+            return set()
+        return set(author_ids) - self._checked
+
+    def get_queryset(self, missing):
+        return Subscription.objects.filter(
+            user=self.user, author_id__in=missing
+        ).values_list("author_id", flat=True)
+
+    def prime(self, author_ids):
+        missing = self.get_missing(author_ids)
+        if not missing:
+            return
+        self._subscribed.update(self.get_queryset(missing))
+        self._checked.update(missing)
+
+    async def aprime(self, author_ids):
+        """prime для асинхронных представлений."""
+        missing = self.get_missing(author_ids)
+        if not missing:
+            return
+        self._subscribed.update(
+            [author_id async for author_id in self.get_queryset(missing)]
+        )
+        self._checked.update(missing)
+
+    def is_subscribed(self, author_id):
+        if not self.user.is_authenticated:
+            return False
+        self.prime([author_id])
+        return author_id in self._subscribed
+
+
+def get_subscription_cache(request):
+    cache = getattr(request, "_subscription_cache", None)
+    if cache is None:
+        cache = SubscriptionCache(request.user)
+        request._subscription_cache = cache
+    return cache
+
+
+class SubscriptionPrimingListSerializer(serializers.ListSerializer):
+    """Загружает подписки для всей страницы до сериализации элементов.
+
+    Дочерний сериализатор должен реализовать ``get_author_ids(items)``.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        request = self.context.get("request")
+        if request is not None:
+            get_subscription_cache(request).prime(
+                self.child.get_author_ids(items)
+            )
+        return super().to_representation(items)
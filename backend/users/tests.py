@@ -1,6 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
+from recipes.models import Recipe
+from users.authentication import TokenCache, token_cache
 from users.models import CustomUser, Subscription
 
 
@@ -41,3 +44,148 @@ class UserAPITestCase(TestCase):
         response = self.client.get("/api/users/subscriptions/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UserListAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+        self.authors = [
+            CustomUser.objects.create_user(
+                email=f"author{index}@example.com",
+                username=f"author{index}",
+                password="testpassword",
+            )
+            for index in range(3)
+        ]
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        self.client.force_authenticate(user=self.user)
+
+    def test_is_subscribed_single_query(self):
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/users/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        subscribed = {
+            user["id"]: user["is_subscribed"]
+            for user in response.data["results"]
+        }
+        self.assertTrue(subscribed[self.authors[0].id])
+        self.assertFalse(subscribed[self.authors[1].id])
+        self.assertFalse(subscribed[self.user.id])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SubscriptionListAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+        self.authors = [
+            CustomUser.objects.create_user(
+                email=f"author{index}@example.com",
+                username=f"author{index}",
+                password="testpassword",
+            )
+            for index in range(2)
+        ]
+        for author in self.authors:
+            Subscription.objects.create(user=self.user, author=author)
+            for index in range(5):
+                Recipe.objects.create(
+                    author=author,
+                    name=f"Recipe {index}",
+                    image="recipes/test.png",
+                    text="Test description",
+                    cooking_time=10,
+                )
+        self.client.force_authenticate(user=self.user)
+
+    def test_recipes_limit_and_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                "/api/users/subscriptions/", {"recipes_limit": 2}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for author in response.data["results"]:
+            self.assertEqual(len(author["recipes"]), 2)
+            self.assertEqual(author["recipes_count"], 5)
+
+    def test_invalid_recipes_limit(self):
+        response = self.client.get(
+            "/api/users/subscriptions/", {"recipes_limit": "abc"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            password="testpassword",
+        )
+
+    def login(self):
+        response = self.client.post(
+            "/api/auth/token/login/",
+            {"email": "reader@example.com", "password": "testpassword"},
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Token {response.data['auth_token']}"
+        )
+
+    def test_cached_until_logout(self):
+        self.login()
+        with self.assertNumQueries(2):
+            self.client.get("/api/users/subscriptions/")
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/subscriptions/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get("/api/users/subscriptions/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user(self):
+        self.login()
+        self.client.get("/api/users/subscriptions/")
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get("/api/users/subscriptions/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_me_counters_fresh(self):
+        self.login()
+        self.client.get("/api/users/me/")
+        Recipe.objects.create(
+            author=self.user,
+            name="Recipe",
+            image="recipes/test.png",
+            text="Test description",
+            cooking_time=10,
+        )
+        response = self.client.get("/api/users/me/")
+        self.assertEqual(response.data["recipes_count"], 1)
+
+    def test_invalidated_in_all_processes(self):
+        token = Token.objects.create(user=self.user)
+        for shared in (False, True):
+            first, second = (TokenCache(10, 60, shared) for _ in range(2))
+            first.set(token.key, self.user)
+            second.set(token.key, self.user)
+            self.assertEqual(first.get(token.key), self.user)
+            # Выход в другом процессе меняет только общее поколение.
+            TokenCache(10, 60, shared).invalidate(self.user.id)
+            self.assertIsNone(first.get(token.key))
+            self.assertIsNone(second.get(token.key))
@@ -1,17 +1,36 @@
+from django.db.models import Prefetch
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from djoser.views import UserViewSet as DjoserUserViewSet
 
+from recipes.models import Recipe
 from users.models import CustomUser
 from users.serializers import (
     UserSerializer,
     SubscriptionSerializer,
     SubscriptionCreateSerializer,
     AvatarSerializer,
+    AvatarUploadSerializer,
+    get_recipes_limit,
 )
 from foodgram.pagination import CustomPagination
+from foodgram.uploads import spool_uploads_to_disk
+
+
+def get_subscriptions_queryset(request):
+    """Авторы из подписок с рецептами, ограниченными recipes_limit."""
+    recipes = Recipe.objects.all()
+    recipes_limit = get_recipes_limit(request)
+    if recipes_limit:
+        recipes = recipes[:recipes_limit]
+    return CustomUser.objects.filter(
+        id__in=request.user.subscriptions.values("author")
+    ).prefetch_related(
+        Prefetch("recipes", queryset=recipes, to_attr="limited_recipes")
+    )
 
 
 class UserViewSet(DjoserUserViewSet):
@@ -31,7 +50,11 @@ class UserViewSet(DjoserUserViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def me(self, request):
-        serializer = self.get_serializer(request.user)
+        # request.user может быть копией из кэша токенов, а счётчики
+        # меняются без сохранения пользователя.
+        serializer = self.get_serializer(
+            self.get_queryset().get(pk=request.user.pk)
+        )
         return Response(serializer.data)
 
     @action(
@@ -46,6 +69,8 @@ class UserViewSet(DjoserUserViewSet):
         serializer = SubscriptionCreateSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        # Сигнал увеличил subscribers_count через F().
+        author.refresh_from_db(fields=["recipes_count", "subscribers_count"])
         output_serializer = SubscriptionSerializer(
             author, context={"request": request}
         )
@@ -70,17 +95,11 @@ class UserViewSet(DjoserUserViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def subscriptions(self, request):
-        user = request.user
-        authors = [
-            subscription.author
-            for subscription in user.subscriptions.select_related("author")
-        ]
-        paginator = CustomPagination()
-        page = paginator.paginate_queryset(authors, request)
+        page = self.paginate_queryset(get_subscriptions_queryset(request))
         serializer = SubscriptionSerializer(
             page, many=True, context={"request": request}
         )
-        return paginator.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=False,
@@ -101,3 +120,20 @@ class UserViewSet(DjoserUserViewSet):
         user.avatar.delete()
         user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=["put"],
+        permission_classes=[IsAuthenticated],
+        parser_classes=[MultiPartParser],
+        url_path="me/avatar/upload",
+    )
+    def avatar_upload(self, request):
+        """Загрузка аватара файлом multipart/form-data."""
+        spool_uploads_to_disk(request)
+        serializer = AvatarUploadSerializer(
+            request.user, data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)